@@ -1,45 +1,52 @@
 from http import HTTPStatus
+from ipaddress import ip_address
 from typing import Annotated
 
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.encoders import jsonable_encoder
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.future import select
+from fastapi import APIRouter, Depends, HTTPException, Request
 
+from core.config import settings
 from services.database import DbDep, CacheDep
-from models.users import User
 from schemas.users import UserSignUp, UserResponseData
 from services.exceptions import wrong_username_or_password
+from services.permissions import get_permissions_claims
+from services.repositories.users import UserRepositoryDep
 from services.token import Token, create_token, \
-    add_not_valid_access_token_to_cache, refresh_access_token, TokenDep
+    add_not_valid_access_token_to_cache, refresh_access_token, TokenDep, \
+    get_password_hash
 from services.users import authenticate_user, add_history
 # Объект router, в котором регистрируем обработчики
 router = APIRouter()
 
 
+def _client_ip(request: Request) -> str | None:
+    if settings.trusted_proxy:
+        # nginx puts the address of the client into X-Real-IP
+        try:
+            return str(ip_address(request.headers.get('x-real-ip', '')))
+        except ValueError:
+            pass
+    return request.client.host if request.client else None
+
+
 @router.post('/signup',
              response_model=UserResponseData,
              status_code=HTTPStatus.CREATED,
              description="регистрация нового пользователя",
              response_description="id, email, hashed password")
-async def create_user(user_create: UserSignUp, db: DbDep) -> UserResponseData:
+async def create_user(user_create: UserSignUp,
+                      users: UserRepositoryDep) -> UserResponseData:
     user_dto = jsonable_encoder(user_create)
-    user = User(**user_dto)
-
-    async with db:
-        user_exists = await db.execute(
-            select(User).filter(User.email == user.email))
-
-        if user_exists.scalars().all():
-            raise HTTPException(
-                status_code=HTTPStatus.UNAUTHORIZED,
-                detail=f"Email {user.email} already exists",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+    user_dto['password'] = await get_password_hash(user_dto['password'])
 
+    user = await users.create(user_dto)
+    if not user:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=f"Email {user_create.email} already exists",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -51,15 +58,20 @@ async def create_user(user_create: UserSignUp, db: DbDep) -> UserResponseData:
              )
 async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+        request: Request,
         db: DbDep,
         cache: CacheDep) -> Token:
     user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise wrong_username_or_password
 
-    await add_history(db=db, user_id=user.id)
+    await add_history(user_id=user.id,
+                      source=_client_ip(request),
+                      user_agent=request.headers.get('user-agent'))
 
-    token_structure = await create_token({"sub": str(user.id)}, cache)
+    claims = await get_permissions_claims(db, cache, str(user.id))
+    token_structure = await create_token({"sub": str(user.id), **claims},
+                                         cache)
     return Token(**token_structure)
 
 
@@ -75,6 +87,6 @@ async def logout(
              response_model=Token,
              description="получить новую пару access/refresh token",
              status_code=HTTPStatus.OK)
-async def refresh(token: str, cache: CacheDep) -> Token:
-    res = await refresh_access_token(token, cache)
+async def refresh(token: str, cache: CacheDep, db: DbDep) -> Token:
+    res = await refresh_access_token(token, cache, db)
     return res
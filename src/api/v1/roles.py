@@ -2,13 +2,13 @@ from http import HTTPStatus
 
 from fastapi.encoders import jsonable_encoder
 from fastapi import APIRouter, HTTPException
-from sqlalchemy.future import select
-from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
-from api.v1 import check_entity_exists
-from services.database import DbDep
+from services.database import CacheDep
+from services.roles import invalidate_roles_cache
+from services.permissions import invalidate_user_permissions
+from services.repositories.roles import RoleRepositoryDep
 
-from models.roles import Role
 from schemas.roles import RoleInDB, RoleCreate
 
 # Объект router, в котором регистрируем обработчики
@@ -20,22 +20,16 @@ router = APIRouter()
              status_code=HTTPStatus.CREATED,
              description="создание новой роли",
              response_description="id, title, permissions")
-async def create_role(role_create: RoleCreate, db: DbDep) -> RoleInDB:
-    role_dto = jsonable_encoder(role_create)
-    role = Role(**role_dto)
-    async with db:
-        role_exists = await db.execute(
-            select(Role).filter(Role.title == role.title))
-
-        if role_exists.scalars().all():
-            raise HTTPException(
-                status_code=HTTPStatus.UNAUTHORIZED,
-                detail=f"Role {role.title} already exists",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-    db.add(role)
-    await db.commit()
-    await db.refresh(role)
+async def create_role(role_create: RoleCreate,
+                      roles: RoleRepositoryDep) -> RoleInDB:
+    role = await roles.create(jsonable_encoder(role_create))
+    if not role:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=f"Role {role_create.title} already exists",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    invalidate_roles_cache()
     return role
 
 
@@ -43,10 +37,8 @@ async def create_role(role_create: RoleCreate, db: DbDep) -> RoleInDB:
             response_model=list[RoleInDB],
             status_code=HTTPStatus.OK,
             description="просмотр всех ролей")
-async def get_all_roles(db: DbDep) -> list[RoleInDB]:
-    response = await db.execute(select(Role))
-    roles = list(response.scalars().all())
-    return roles
+async def get_all_roles(roles: RoleRepositoryDep) -> list[RoleInDB]:
+    return await roles.get_all()
 
 
 @router.patch('/{role_id}',
@@ -55,47 +47,54 @@ async def get_all_roles(db: DbDep) -> list[RoleInDB]:
               description="изменение роли")
 async def update_role(role_id: str,
                       role_create: RoleCreate,
-                      db: DbDep) -> RoleInDB:
+                      roles: RoleRepositoryDep,
+                      cache: CacheDep) -> RoleInDB:
+    values = {}
+    if role_create.title:
+        values['title'] = role_create.title
+    if role_create.permissions:
+        values['permissions'] = role_create.permissions
     try:
-        async with db:
-            await check_entity_exists(db, Role, role_id)
-
-            role_exists = await db.execute(
-                select(Role).
-                filter(Role.title == role_create.title))
-
-            if role_exists.scalars().all():
-                raise HTTPException(
-                    status_code=HTTPStatus.UNAUTHORIZED,
-                    detail=f"Role {role_create.title} already exists",
-                    headers={"WWW-Authenticate": "Bearer"}
-                )
-        role = await db.get(Role, role_id)
-        if role_create.title:
-            role.title = role_create.title
-        if role_create.permissions:
-            role.permissions = role_create.permissions
-        await db.commit()
-        return RoleInDB(id=role.id,
-                        title=role.title,
-                        permissions=role.permissions)
+        role = await roles.update(role_id, values)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=f"Role {role_create.title} already exists",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
     except DBAPIError:
+        # Not a valid UUID
+        role = None
+    if not role:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND,
                             detail=f'Role with ID: {role_id} not found',
                             headers={"WWW-Authenticate": "Bearer"})
 
+    invalidate_roles_cache()
+    await invalidate_user_permissions(cache, await roles.get_users(role_id))
+    return RoleInDB(id=role.id,
+                    title=role.title,
+                    permissions=role.permissions)
+
 
 @router.delete('/delete/{role_id}',
                response_model=None,
                status_code=HTTPStatus.NO_CONTENT,
                description="удаление роли")
-async def delete_role(role_id: str, db: DbDep):
+async def delete_role(role_id: str,
+                      roles: RoleRepositoryDep,
+                      cache: CacheDep):
     try:
-        role = await check_entity_exists(db, Role, role_id)
-
-        await db.delete(role)
-        await db.commit()
+        # users_roles rows are removed by cascade, so collect users before
+        user_ids = await roles.get_users(role_id)
+        deleted = await roles.delete(role_id)
     except DBAPIError:
+        # Not a valid UUID
+        deleted = False
+    if not deleted:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND,
                             detail=f'Role {role_id} not found',
                             headers={"WWW-Authenticate": "Bearer"})
+
+    invalidate_roles_cache()
+    await invalidate_user_permissions(cache, user_ids)
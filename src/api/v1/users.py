@@ -1,20 +1,22 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import update
-from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
-from api.v1 import check_entity_exists
+from db.postgres import UNIQUE_VIOLATION
 from models.model import PaginateModel
-from services.users import CurrentUserDep, CheckAdminDep
-from services.database import DbDep
-from models.users import User
-from models.history import LoginHistory
-from models.roles import UserRole, Role
+from services.exceptions import entity_doesnt_exist
+from services.pagination import encode_cursor, decode_cursor
+from services.permissions import invalidate_user_permissions
+from services.repositories.history import HistoryRepositoryDep
+from services.repositories.roles import RoleRepositoryDep
+from services.repositories.users import UserRepositoryDep
+from services.users import CurrentUserDep, CheckAdminDep, \
+    invalidate_user_cache
+from services.database import CacheDep
 from schemas.users import UserResponseData, UserLogin, UserRoleInDB, \
-    UserRoleCreate, UserHistory
+    UserRoleCreate, UserHistory, UserRolesBulk, UserRoleBulkResult
 from schemas.roles import RoleCreate
 from services.token import get_password_hash
 
@@ -37,54 +39,57 @@ async def read_users_me(current_user: CurrentUserDep) -> UserResponseData:
 async def change_login_password(
         new_login: UserLogin,
         current_user: CurrentUserDep,
-        db: DbDep) -> UserResponseData:
-    async with db:
-        user_exists = await db.execute(
-            select(User).
-            filter(User.email == new_login.email)
+        users: UserRepositoryDep,
+        cache: CacheDep) -> UserResponseData:
+    hashed_password = await get_password_hash(new_login.password)
+    try:
+        new_user = await users.update_login(current_user.id,
+                                            email=new_login.email,
+                                            password=hashed_password)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Email {new_login.email} already exists",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-
-        if user_exists.scalars().all():
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"Email {new_login.email} already exists",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        await db.execute(update(User).
-                         where(User.email == current_user.email).
-                         values(password=get_password_hash(new_login.password),
-                                email=new_login.email))
-        await db.commit()
-        new_user = await db.execute(
-            select(User).
-            filter(User.email == new_login.email))
-        new_user = new_user.scalars().all()
-        if new_user:
-            return UserResponseData(**jsonable_encoder(new_user[0]))
+    await invalidate_user_cache(cache, current_user.id)
+    if new_user:
+        return UserResponseData(**jsonable_encoder(new_user))
 
 
 @router.get("/login-history",
-            description="История логинов пользователя",
+            description="История логинов пользователя. Следующую страницу "
+                        "можно получить по курсору из заголовка "
+                        "X-Next-Cursor",
             response_model=list[UserHistory],
             status_code=status.HTTP_200_OK)
 async def get_login_history(current_user: CurrentUserDep,
-                            db: DbDep,
-                            pagination: Paginate) -> list[UserHistory]:
+                            history_repository: HistoryRepositoryDep,
+                            pagination: Paginate,
+                            response: Response) -> list[UserHistory]:
 
     page_number = pagination.page_number
     page_size = pagination.page_size
 
-    history_exists = await db.execute(
-        select(LoginHistory).
-        filter(LoginHistory.user_id == current_user.id).
-        order_by(LoginHistory.login_time.desc()).
-        offset((page_number - 1) * page_size).
-        limit(page_size)
-    )
-    history = history_exists.scalars().all()
+    if pagination.cursor:
+        history = await history_repository.get_page(
+            current_user.id,
+            page_size,
+            cursor=decode_cursor(pagination.cursor))
+    else:
+        history = await history_repository.get_page(
+            current_user.id,
+            page_size,
+            offset=(page_number - 1) * page_size)
+
+    if len(history) == page_size:
+        last = history[-1].LoginHistory
+        response.headers['X-Next-Cursor'] = encode_cursor(last.login_time,
+                                                          last.id)
     return [UserHistory(user_id=h.user_id,
                         source=h.source,
-                        login_time=h.login_time) for h in history]
+                        user_agent=user_agent,
+                        login_time=h.login_time) for h, user_agent in history]
 
 
 @router.post("/add-role",
@@ -93,39 +98,31 @@ async def get_login_history(current_user: CurrentUserDep,
              status_code=status.HTTP_201_CREATED)
 async def add_role(user_role: UserRoleCreate,
                    check_admin: CheckAdminDep,
-                   db: DbDep) -> UserRoleInDB:
+                   roles: RoleRepositoryDep,
+                   cache: CacheDep) -> UserRoleInDB:
+    # The unique constraint and foreign keys do the checks in one round trip
     try:
-
-        async with db:
-            await check_entity_exists(db, User, user_role.user_id)
-            await check_entity_exists(db, Role, user_role.role_id)
-
-            roles_exists = await db.execute(
-                select(UserRole).
-                filter(UserRole.user_id == user_role.user_id)
+        user_role_db = await roles.add_user_role(user_role.user_id,
+                                                 user_role.role_id)
+    except IntegrityError as e:
+        if getattr(e.orig, 'sqlstate', None) == UNIQUE_VIOLATION:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Role {user_role.role_id} already exists for user "
+                       f"{user_role.user_id}",
+                headers={"WWW-Authenticate": "Bearer"},
             )
-            all_roles = [row.role_id for row in roles_exists.scalars().all()]
-            if user_role.role_id in all_roles:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail=f"Role {user_role.role_id} already exists for user "
-                           f"{user_role.user_id}",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-            user_role_db = UserRole(user_role.user_id, user_role.role_id)
-            db.add(user_role_db)
-            await db.commit()
-            await db.refresh(user_role_db)
-            return UserRoleInDB(id=user_role_db.id,
-                                user_id=user_role_db.user_id,
-                                role_id=user_role_db.role_id)
-    except IntegrityError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"role_id: {user_role_db.role_id} OR "
-                                   f"user_id: {user_role_db.user_id} not "
+                            detail=f"role_id: {user_role.role_id} OR "
+                                   f"user_id: {user_role.user_id} not "
                                    f"found",
                             headers={"WWW-Authenticate": "Bearer"})
 
+    await invalidate_user_permissions(cache, [user_role.user_id])
+    return UserRoleInDB(id=user_role_db.id,
+                        user_id=user_role_db.user_id,
+                        role_id=user_role_db.role_id)
+
 
 @router.delete("/delete-role",
                description="Удалить роль у пользователя",
@@ -133,27 +130,125 @@ async def add_role(user_role: UserRoleCreate,
                status_code=status.HTTP_204_NO_CONTENT)
 async def delete_role(user_role: UserRoleCreate,
                       check_admin: CheckAdminDep,
-                      db: DbDep) -> None:
-    async with db:
-        await check_entity_exists(db, User, user_role.user_id)
-        await check_entity_exists(db, Role, user_role.role_id)
-
-        roles_exists = await db.execute(
-            select(UserRole).
-            filter(UserRole.user_id == user_role.user_id)
+                      users: UserRepositoryDep,
+                      roles: RoleRepositoryDep,
+                      cache: CacheDep) -> None:
+    if not await roles.delete_user_role(user_role.user_id,
+                                        user_role.role_id):
+        # Existence is checked only to report what is missing
+        if not await users.exists(user_role.user_id):
+            raise entity_doesnt_exist('User', str(user_role.user_id))
+        if not await roles.exists(user_role.role_id):
+            raise entity_doesnt_exist('Role', str(user_role.role_id))
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Role with ID: {user_role.role_id} not found for user"
+                   f" {user_role.user_id}",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        all_rows = roles_exists.scalars().all()
-        if user_role.role_id not in [row.role_id for row in all_rows]:
+    await invalidate_user_permissions(cache, [user_role.user_id])
+
+
+def _missing_status(user_id, role_id, users: set, roles: set) -> str:
+    if user_id not in users:
+        return 'user_not_found'
+    if role_id not in roles:
+        return 'role_not_found'
+    return 'not_found'
+
+
+@router.post("/add-roles:bulk",
+             description="Добавить роли пользователям списком. Для каждой "
+                         "пары возвращается status: created, exists, "
+                         "user_not_found или role_not_found",
+             response_model=list[UserRoleBulkResult],
+             status_code=status.HTTP_200_OK)
+async def add_roles_bulk(user_roles: UserRolesBulk,
+                         check_admin: CheckAdminDep,
+                         users: UserRepositoryDep,
+                         roles: RoleRepositoryDep,
+                         cache: CacheDep) -> list[UserRoleBulkResult]:
+    pairs = list(dict.fromkeys((item.user_id, item.role_id)
+                               for item in user_roles.items))
+    existing_users = await users.get_existing_ids(
+        list({user_id for user_id, _ in pairs}))
+    existing_roles = await roles.get_existing_ids(
+        list({role_id for _, role_id in pairs}))
+
+    valid = [(user_id, role_id) for user_id, role_id in pairs
+             if user_id in existing_users and role_id in existing_roles]
+    valid_pairs = set(valid)
+    added = {}
+    if valid:
+        try:
+            added = await roles.add_user_roles(valid)
+        except IntegrityError:
+            # A user or a role was deleted after the check
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Role with ID: {user_role.role_id} not found for user"
-                       f" {user_role.user_id}",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        user_role_db = [row for row in all_rows
-                        if user_role.role_id == row.role_id][0]
-        await db.delete(user_role_db)
-        await db.commit()
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Users or roles were changed. Please try again.")
+
+    results = []
+    for item in user_roles.items:
+        pair = (item.user_id, item.role_id)
+        if pair in added:
+            item_status = 'created'
+        elif pair in valid_pairs:
+            item_status = 'exists'
+        else:
+            item_status = _missing_status(*pair,
+                                          users=existing_users,
+                                          roles=existing_roles)
+        results.append(UserRoleBulkResult(user_id=item.user_id,
+                                          role_id=item.role_id,
+                                          status=item_status,
+                                          id=added.get(pair)))
+
+    await invalidate_user_permissions(
+        cache, list({user_id for user_id, _ in added}))
+    return results
+
+
+@router.post("/delete-roles:bulk",
+             description="Удалить роли у пользователей списком. Для каждой "
+                         "пары возвращается status: deleted, not_found, "
+                         "user_not_found или role_not_found",
+             response_model=list[UserRoleBulkResult],
+             status_code=status.HTTP_200_OK)
+async def delete_roles_bulk(user_roles: UserRolesBulk,
+                            check_admin: CheckAdminDep,
+                            users: UserRepositoryDep,
+                            roles: RoleRepositoryDep,
+                            cache: CacheDep) -> list[UserRoleBulkResult]:
+    pairs = list(dict.fromkeys((item.user_id, item.role_id)
+                               for item in user_roles.items))
+    deleted = await roles.delete_user_roles(pairs)
+
+    # Existence is checked only to report what is missing
+    not_deleted = [pair for pair in pairs if pair not in deleted]
+    existing_users, existing_roles = set(), set()
+    if not_deleted:
+        existing_users = await users.get_existing_ids(
+            list({user_id for user_id, _ in not_deleted}))
+        existing_roles = await roles.get_existing_ids(
+            list({role_id for _, role_id in not_deleted}))
+
+    results = []
+    for item in user_roles.items:
+        pair = (item.user_id, item.role_id)
+        if pair in deleted:
+            item_status = 'deleted'
+        else:
+            item_status = _missing_status(*pair,
+                                          users=existing_users,
+                                          roles=existing_roles)
+        results.append(UserRoleBulkResult(user_id=item.user_id,
+                                          role_id=item.role_id,
+                                          status=item_status))
+
+    await invalidate_user_permissions(
+        cache, list({user_id for user_id, _ in deleted}))
+    return results
 
 
 @router.get('/roles',
@@ -162,22 +257,11 @@ async def delete_role(user_role: UserRoleCreate,
             description="просмотр всех ролей пользователя")
 async def get_all_roles(user_id: str,
                         check_admin: CheckAdminDep,
-                        db: DbDep) -> list[RoleCreate]:
-    async with db:
-        await check_entity_exists(db, User, user_id)
+                        users: UserRepositoryDep,
+                        roles: RoleRepositoryDep) -> list[RoleCreate]:
+    if not await users.exists(user_id):
+        raise entity_doesnt_exist('User', user_id)
 
-        roles_exists = await db.execute(
-            select(UserRole).
-            filter(UserRole.user_id == user_id)
-        )
-        all_roles = [row.role_id for row in roles_exists.scalars().all()]
-        roles = []
-        for r_id in all_roles:
-            response = await db.execute(
-                select(Role).
-                filter(Role.id == r_id)
-            )
-            role = response.scalars().first()
-            roles.append(RoleCreate(title=role.title,
-                                    permissions=role.permissions))
-        return roles
+    return [RoleCreate(title=role.title,
+                       permissions=role.permissions)
+            for role in await roles.get_user_roles(user_id)]
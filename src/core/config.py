@@ -12,10 +12,65 @@ class Settings(BaseSettings):
     project_name: str = Field(..., env='PROJECT_NAME')
     redis_host: str = Field(..., env='REDIS_HOST')
     redis_port: int = Field(..., env='REDIS_PORT')
+    redis_max_connections: int = Field(50, env='REDIS_MAX_CONNECTIONS')
+    # Max time to wait for a free connection from the pool
+    redis_pool_timeout: float = Field(5, env='REDIS_POOL_TIMEOUT')
+    redis_socket_timeout: float = Field(5, env='REDIS_SOCKET_TIMEOUT')
+    redis_socket_connect_timeout: float = Field(
+        5, env='REDIS_SOCKET_CONNECT_TIMEOUT')
+    redis_health_check_interval: int = Field(
+        30, env='REDIS_HEALTH_CHECK_INTERVAL')
+    redis_retries: int = Field(3, env='REDIS_RETRIES')
+    redis_backoff_base: float = Field(0.01, env='REDIS_BACKOFF_BASE')
+    redis_backoff_cap: float = Field(0.5, env='REDIS_BACKOFF_CAP')
     host: str = Field(..., env='HOST')
     port: int = Field(..., env='PORT')
     secret_key: str = Field(..., env='SECRET_KEY')
     secret_key_refresh: str = Field(..., env='SECRET_KEY_REFRESH')
+    # 'thread' or 'process'
+    password_hash_executor: str = Field('thread',
+                                        env='PASSWORD_HASH_EXECUTOR')
+    password_hash_workers: int = Field(4, env='PASSWORD_HASH_WORKERS')
+    password_hash_max_queue: int = Field(100, env='PASSWORD_HASH_MAX_QUEUE')
+    token_cache_size: int = Field(10000, env='TOKEN_CACHE_SIZE')
+    roles_cache_ttl: int = Field(60, env='ROLES_CACHE_TTL')
+    permissions_cache_expire: int = Field(3600,
+                                          env='PERMISSIONS_CACHE_EXPIRE')
+    revocation_filter_capacity: int = Field(
+        100000, env='REVOCATION_FILTER_CAPACITY')
+    revocation_filter_error_rate: float = Field(
+        0.001, env='REVOCATION_FILTER_ERROR_RATE')
+    revocation_sync_interval: float = Field(1.0,
+                                            env='REVOCATION_SYNC_INTERVAL')
+    db_pool_size: int = Field(5, env='DB_POOL_SIZE')
+    db_max_overflow: int = Field(10, env='DB_MAX_OVERFLOW')
+    db_pool_timeout: float = Field(30, env='DB_POOL_TIMEOUT')
+    # -1 disables connections recycling
+    db_pool_recycle: int = Field(1800, env='DB_POOL_RECYCLE')
+    db_pool_pre_ping: bool = Field(True, env='DB_POOL_PRE_PING')
+    db_statement_cache_size: int = Field(100, env='DB_STATEMENT_CACHE_SIZE')
+    # 0 disables users cache
+    user_cache_expire: int = Field(60, env='USER_CACHE_EXPIRE')
+    history_batch_size: int = Field(500, env='HISTORY_BATCH_SIZE')
+    history_flush_interval: float = Field(0.5, env='HISTORY_FLUSH_INTERVAL')
+    # Logins write history inline when the queue is full
+    history_max_queue: int = Field(10000, env='HISTORY_MAX_QUEUE')
+    user_agents_cache_size: int = Field(1000, env='USER_AGENTS_CACHE_SIZE')
+    # Take client IP from X-Real-IP, only when the app is behind nginx
+    trusted_proxy: bool = Field(False, env='TRUSTED_PROXY')
+    # Needs packages from requirements-tracing.txt
+    tracing_enabled: bool = Field(False, env='TRACING_ENABLED')
+    # 'otlp' or 'file'
+    tracing_exporter: str = Field('otlp', env='TRACING_EXPORTER')
+    tracing_otlp_endpoint: str = Field('http://localhost:4318/v1/traces',
+                                       env='TRACING_OTLP_ENDPOINT')
+    tracing_file: str = Field('traces.jsonl', env='TRACING_FILE')
+    tracing_sample_ratio: float = Field(1.0, env='TRACING_SAMPLE_RATIO')
+    # 0 disables slow queries / requests log
+    slow_query_ms: float = Field(100, env='SLOW_QUERY_MS')
+    slow_request_ms: float = Field(1000, env='SLOW_REQUEST_MS')
+    # Max records per second of each log, the rest are counted only
+    slow_log_rate: int = Field(10, env='SLOW_LOG_RATE')
 
     class Config:
         env_file = '.env'
@@ -48,5 +103,8 @@ PASSWORD_DESC = "Password: Minimum eight characters, " \
                 "at least one letter and one number:"
 ROLE_TITLE_DESC = "Roles title"
 PERMISSIONS_DESC = "Permission for the role"
+BULK_MAX_ITEMS = 1000
 PAGE_DESC = "Номер страницы"
 SIZE_DESC = "Количество элементов на странице"
+CURSOR_DESC = "Курсор следующей страницы из заголовка X-Next-Cursor. " \
+              "Если указан, page_number не используется"
@@ -18,6 +18,9 @@ LOGGING = {
             'fmt': '%(levelprefix)s %(message)s',
             'use_colors': None,
         },
+        'json': {
+            'format': '%(message)s'
+        },
         'access': {
             '()': 'uvicorn.logging.AccessFormatter',
             'fmt': "%(levelprefix)s %(client_addr)s - "
@@ -40,6 +43,11 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'stream': 'ext://sys.stdout',
         },
+        'slow_log': {
+            'formatter': 'json',
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+        },
     },
     'loggers': {
         '': {
@@ -54,6 +62,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # One JSON object per line
+        'slow_log': {
+            'handlers': ['slow_log'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
     'root': {
         'level': 'INFO',
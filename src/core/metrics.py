@@ -0,0 +1,169 @@
+import time
+from functools import wraps
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, \
+    generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+from core.tracing import span
+
+# Redis, SQL and dependencies usually take less than a millisecond
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                0.5, 1.0, 2.5, 5.0)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template and status',
+    ['method', 'route', 'status'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+             2.5, 5.0, 10.0))
+DEPENDENCY_DURATION = Histogram(
+    'dependency_duration_seconds',
+    'Time spent in auth dependencies and password hashing',
+    ['dependency'],
+    buckets=FAST_BUCKETS)
+REDIS_COMMAND_DURATION = Histogram(
+    'redis_command_duration_seconds',
+    'Redis command latency',
+    ['command'],
+    buckets=FAST_BUCKETS)
+SQL_DURATION = Histogram(
+    'sql_statement_duration_seconds',
+    'SQL statement latency by statement type',
+    ['statement'],
+    buckets=FAST_BUCKETS)
+
+
+def timed(name: str):
+    """
+    Декоратор async функции, время выполнения пишется в
+    dependency_duration_seconds, при включенной трассировке функция
+    выполняется в span name. Сигнатура сохраняется, поэтому подходит
+    для зависимостей FastAPI.
+    :param name: значение метки dependency
+    """
+    histogram = DEPENDENCY_DURATION.labels(name)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with span(name):
+                    return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    # Label by the first keyword only, full statements would explode the
+    # number of series
+    SQL_DURATION.labels(statement.split(None, 1)[0].upper()).observe(
+        time.perf_counter() - context._metrics_start)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Замеряет время SQL запросов engine
+    """
+    event.listen(engine.sync_engine, 'before_cursor_execute',
+                 _before_cursor_execute)
+    event.listen(engine.sync_engine, 'after_cursor_execute',
+                 _after_cursor_execute)
+
+
+class StatsCollector:
+    """
+    Отдает stats() сервисов как gauge в момент запроса /metrics:
+    {prefix}_{key} для каждого числового значения
+    """
+    def __init__(self):
+        self.sources: dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        for prefix, stats in self.sources.items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    yield GaugeMetricFamily(f'{prefix}_{key}',
+                                            f'{prefix} {key}',
+                                            value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(prefix: str, stats: Callable[[], dict]) -> None:
+    """
+    :param prefix: префикс имен метрик, например redis_pool
+    :param stats: функция, возвращающая {имя: значение}
+    """
+    stats_collector.sources[prefix] = stats
+
+
+# {app: {endpoint: route path}}
+_route_paths: dict = {}
+
+
+def route_template(scope) -> str:
+    """
+    Шаблон пути запроса (/api/v1/roles/{role_id}), а не сам путь, чтобы
+    количество серий не зависело от id в запросах
+    """
+    # Router puts the matched endpoint into scope, route.path is the
+    # template
+    app = scope['app']
+    paths = _route_paths.get(app)
+    if paths is None:
+        paths = _route_paths[app] = {route.endpoint: route.path
+                                     for route in app.routes
+                                     if hasattr(route, 'endpoint')}
+    return paths.get(scope.get('endpoint'), 'unmatched')
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: время запросов по шаблону пути, методу и статусу
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = int(message['status'])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.labels(scope['method'],
+                                    route_template(scope),
+                                    status).observe(
+                time.perf_counter() - start)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY),
+                    media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.metrics import route_template
+
+logger = logging.getLogger('slow_log')
+
+# Request being handled: scope and SQL statements count and time
+_request: ContextVar[dict | None] = ContextVar('slow_log_request',
+                                               default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_POSITIONAL = re.compile(r'\$\d+')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMS_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> tuple[str, str]:
+    """
+    Нормализует запрос: литералы и позиционные параметры заменяются на ?,
+    списки параметров IN (...) сворачиваются, пробелы схлопываются.
+    :return: хэш нормализованного запроса и сам запрос
+    """
+    normalized = _STRING.sub('?', statement)
+    normalized = _POSITIONAL.sub('?', normalized)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PARAMS_LIST.sub('(...)', normalized)
+    normalized = _SPACES.sub(' ', normalized).strip()
+    return (hashlib.md5(normalized.encode()).hexdigest()[:16],
+            normalized)
+
+
+def redact(parameters, executemany: bool) -> list | dict:
+    """
+    Типы параметров вместо значений: в запросах есть email и хэши паролей
+    """
+    if executemany:
+        return {'rows': len(parameters)}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__
+                for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+class RateLimiter:
+    """
+    Не больше max_per_second записей в секунду, остальные пропускаются и
+    считаются в suppressed следующей записи
+    """
+    def __init__(self, max_per_second: int):
+        self.max_per_second = max_per_second
+        self.suppressed = 0
+        self._second = 0
+        self._count = 0
+
+    def allow(self) -> bool:
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second = second
+            self._count = 0
+        if self._count >= self.max_per_second:
+            self.suppressed += 1
+            return False
+        self._count += 1
+        return True
+
+    def take_suppressed(self) -> int:
+        suppressed, self.suppressed = self.suppressed, 0
+        return suppressed
+
+
+def _log(limiter: RateLimiter, record: dict) -> None:
+    if limiter.allow():
+        record['suppressed'] = limiter.take_suppressed()
+        logger.warning(orjson.dumps(record).decode())
+
+
+class SlowQueryLogger:
+    """
+    Пишет в лог SQL запросы дольше threshold_ms. Считает количество и время
+    запросов для SlowRequestMiddleware.
+    """
+    def __init__(self, threshold_ms: float, max_per_second: int = 10):
+        self.threshold = threshold_ms / 1000
+        self.limiter = RateLimiter(max_per_second)
+
+    def instrument(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, 'before_cursor_execute',
+                     self._before_cursor_execute)
+        event.listen(engine.sync_engine, 'after_cursor_execute',
+                     self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        context._slow_log_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        duration = time.perf_counter() - context._slow_log_start
+        request = _request.get()
+        if request is not None:
+            request['sql_count'] += 1
+            request['sql_seconds'] += duration
+
+        if duration < self.threshold:
+            return
+        statement_id, normalized = fingerprint(statement)
+        _log(self.limiter,
+             {'type': 'slow_query',
+              'duration_ms': round(duration * 1000, 2),
+              'fingerprint': statement_id,
+              'statement': normalized,
+              'params': redact(parameters, executemany),
+              'route': (route_template(request['scope'])
+                        if request else None)})
+
+
+class SlowRequestMiddleware:
+    """
+    ASGI middleware: пишет в лог запросы дольше threshold_ms с количеством
+    и временем SQL запросов внутри
+    """
+    def __init__(self, app, threshold_ms: float, max_per_second: int = 10):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+        self.limiter = RateLimiter(max_per_second)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = int(message['status'])
+            await send(message)
+
+        request = {'scope': scope, 'sql_count': 0, 'sql_seconds': 0.0}
+        token = _request.set(request)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            _request.reset(token)
+            if duration >= self.threshold:
+                _log(self.limiter,
+                     {'type': 'slow_request',
+                      'duration_ms': round(duration * 1000, 2),
+                      'method': scope['method'],
+                      'route': route_template(scope),
+                      'status': status,
+                      'sql_count': request['sql_count'],
+                      'sql_ms': round(request['sql_seconds'] * 1000, 2)})
@@ -0,0 +1,110 @@
+"""
+Трассировка OpenTelemetry, включается TRACING_ENABLED. Пакеты
+OpenTelemetry необязательны (requirements-tracing.txt): если трассировка
+выключена или пакеты не установлены, все функции модуля ничего не делают.
+"""
+import logging
+from contextlib import nullcontext
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, \
+        ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, \
+        TraceIdRatioBased
+except ImportError:
+    trace = None
+
+_no_span = nullcontext()
+_provider = None
+_traces_file = None
+tracer = None
+
+
+def span(name: str):
+    """
+    Контекстный менеджер span с именем name, дочернего к текущему
+    """
+    if tracer is None:
+        return _no_span
+    return tracer.start_as_current_span(name)
+
+
+def setup(service_name: str,
+          exporter: str = 'otlp',
+          otlp_endpoint: str = None,
+          traces_file: str = None,
+          sample_ratio: float = 1.0) -> bool:
+    """
+    Настраивает экспорт span
+    :param exporter: 'otlp' или 'file'
+    :param otlp_endpoint: OTLP/HTTP endpoint коллектора
+    :param traces_file: файл для exporter 'file', span по строке в JSON
+    :param sample_ratio: доля трассируемых запросов
+    :return: False, если пакеты OpenTelemetry не установлены
+    """
+    global _provider, _traces_file, tracer
+
+    if trace is None:
+        logging.warning('Tracing is enabled, but opentelemetry packages '
+                        'are not installed')
+        return False
+
+    if exporter == 'file':
+        _traces_file = open(traces_file, 'a')
+        span_exporter = ConsoleSpanExporter(
+            out=_traces_file,
+            formatter=lambda s: s.to_json(indent=None) + '\n')
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import \
+            OTLPSpanExporter
+        span_exporter = OTLPSpanExporter(endpoint=otlp_endpoint)
+
+    _provider = TracerProvider(
+        resource=Resource.create({SERVICE_NAME: service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(_provider)
+    tracer = trace.get_tracer(__name__)
+    return True
+
+
+def instrument_app(app) -> None:
+    """
+    Span для каждого запроса FastAPI и команд Redis
+    """
+    if _provider is None:
+        return
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+
+    FastAPIInstrumentor.instrument_app(app,
+                                       tracer_provider=_provider,
+                                       excluded_urls='metrics')
+    RedisInstrumentor().instrument(tracer_provider=_provider)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Span для SQL запросов engine
+    """
+    if _provider is None:
+        return
+    from opentelemetry.instrumentation.sqlalchemy import \
+        SQLAlchemyInstrumentor
+
+    SQLAlchemyInstrumentor().instrument(engine=engine.sync_engine,
+                                        tracer_provider=_provider)
+
+
+def shutdown() -> None:
+    """
+    Отправляет накопленные span
+    """
+    if _provider is None:
+        return
+    _provider.shutdown()
+    if _traces_file:
+        _traces_file.close()
@@ -15,6 +15,7 @@ from core.config import database_dsn
 from models.users import User
 from models.roles import UserRole, Role
 from schemas.users import UserSignUp
+from services.password import hash_password
 
 load_dotenv()
 
@@ -44,7 +45,9 @@ def main():
             filter(Role.title == 'admin')
         )
         if not admin.scalars().first():
-            data = [User(**jsonable_encoder(user_data)),
+            user_dto = jsonable_encoder(user_data)
+            user_dto['password'] = hash_password(user_dto['password'])
+            data = [User(**user_dto),
                     Role('admin', 7)]
             for el in data:
                 session.add(el)
@@ -68,6 +68,16 @@ class AbstractCache(ABC):
         """
         ...
 
+    @abstractmethod
+    async def put_to_cache_by_ids(self, entities: dict, expire):
+        """
+        Абстрактный асинхронный метод, который кладет в кэш данные по
+        нескольким id за один запрос
+        :param entities: {id: данные}
+        :param expire: время жизни записей, None - без ограничения
+        """
+        ...
+
     @abstractmethod
     async def delete_from_cache_by_id(self, _id):
         """
@@ -76,6 +86,28 @@ class AbstractCache(ABC):
         """
         ...
 
+    @abstractmethod
+    async def delete_from_cache_by_ids(self, ids: list):
+        """
+        Абстрактный асинхронный метод, который удаляет из кэша данные по
+        нескольким id за один запрос
+        :param ids: список id
+        """
+        ...
+
+    @abstractmethod
+    async def pop_and_put_by_id(self, old_id, new_id, entity, expire):
+        """
+        Абстрактный асинхронный метод, который атомарно удаляет данные по
+        old_id и, если они были, кладет entity по new_id
+        :param old_id: id, данные по которому удаляются
+        :param new_id: id для новых данных
+        :param entity: данные, которые кладем в кэш
+        :param expire: время жизни новой записи
+        :return: удаленные данные или None, если их не было
+        """
+        ...
+
     @abstractmethod
     async def get_from_cache_by_key(self,
                                     model,
@@ -100,3 +132,37 @@ class AbstractCache(ABC):
         :param entities: данные, которые кладем в кэш
         """
         ...
+
+    @abstractmethod
+    async def put_to_sorted_set(self, key: str, member: str) -> float:
+        """
+        Абстрактный асинхронный метод, который добавляет элемент в
+        сортированное множество. Вес - время сервера кэша в секундах, у
+        элементов, добавленных позже, вес всегда больше.
+        :param key: ключ множества
+        :param member: элемент
+        :return: вес элемента
+        """
+        ...
+
+    @abstractmethod
+    async def get_from_sorted_set(self,
+                                  key: str,
+                                  min_score: float | str = '-inf',
+                                  max_score: float | str = '+inf') -> list:
+        """
+        Абстрактный асинхронный метод для получения элементов сортированного
+        множества с весом от min_score до max_score
+        :return: список пар (элемент, вес)
+        """
+        ...
+
+    @abstractmethod
+    async def delete_from_sorted_set(self,
+                                     key: str,
+                                     max_score: float | str):
+        """
+        Абстрактный асинхронный метод, который удаляет из сортированного
+        множества элементы с весом не больше max_score
+        """
+        ...
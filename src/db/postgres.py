@@ -1,29 +1,98 @@
+import logging
 import os
+import time
 
 from db import AbstractStorage
 from sqlalchemy import MetaData
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, \
     async_sessionmaker
 
+# SQLSTATE codes of IntegrityError.orig
+UNIQUE_VIOLATION = '23505'
+FOREIGN_KEY_VIOLATION = '23503'
+
 # Создаём базовый класс для будущих моделей
 Base = declarative_base(metadata=MetaData(schema='auth'))
 
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает время ожидания свободного соединения
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if wait > self._timeout / 2:
+                logging.warning('Waited %.3f s for a database connection, '
+                                '%s connections are in use',
+                                wait, self.checkedout())
+
+    def recreate(self):
+        # Keep statistics when pool is recreated after disconnect
+        pool = super().recreate()
+        pool.wait_count = self.wait_count
+        pool.wait_seconds_total = self.wait_seconds_total
+        pool.wait_seconds_max = self.wait_seconds_max
+        return pool
+
+
 class Postgres(AbstractStorage):
-    def __init__(self, url: str):
+    def __init__(self,
+                 url: str,
+                 pool_size: int = 5,
+                 max_overflow: int = 10,
+                 pool_timeout: float = 30,
+                 pool_recycle: int = -1,
+                 pool_pre_ping: bool = False,
+                 statement_cache_size: int = 100):
         echo = (os.getenv('ENGINE_ECHO', 'False') == 'True')
-        self.engine = create_async_engine(url,
-                                          echo=echo,
-                                          future=True)
+        self.engine = create_async_engine(
+            url,
+            echo=echo,
+            future=True,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+            # asyncpg and SQLAlchemy asyncpg adapter prepared statements
+            # caches. Must be 0 behind pgbouncer in transaction mode.
+            connect_args={
+                'statement_cache_size': statement_cache_size,
+                'prepared_statement_cache_size': statement_cache_size})
 
         self.async_session = async_sessionmaker(self.engine,
                                                 class_=AsyncSession,
                                                 expire_on_commit=False)
 
+    def pool_stats(self) -> dict:
+        pool = self.engine.pool
+        return {'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'wait_count': pool.wait_count,
+                'wait_seconds_total': pool.wait_seconds_total,
+                'wait_seconds_max': pool.wait_seconds_max}
+
     async def close(self):
-        ...
+        await self.engine.dispose()
 
     async def create_database(self) -> None:
         async with self.engine.begin() as conn:
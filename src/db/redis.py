@@ -1,18 +1,133 @@
 import json
+import logging
+import time
 
 from typing import Optional
 from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.connection import BlockingConnectionPool, Connection, \
+    SSLConnection
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
 
 from core.config import settings
+from core.metrics import REDIS_COMMAND_DURATION
 from db import AbstractCache
 
 
+# KEYS[1] - old key, KEYS[2] - new key, ARGV[1] - new value, ARGV[2] - ttl
+POP_AND_PUT_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('DEL', KEYS[1])
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+end
+return value
+"""
+
+# KEYS[1] - sorted set, ARGV[1] - member. Score is Redis server time, but
+# never lower than the current max score: members added later always get
+# higher scores, whatever the clocks of the clients are.
+PUT_TO_SORTED_SET_SCRIPT = """
+local now = redis.call('TIME')
+local score = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local last = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if last[2] and tonumber(last[2]) >= score then
+    score = tonumber(last[2]) + 0.000001
+end
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+return tostring(score)
+"""
+
+
+class CountingConnectionPool(BlockingConnectionPool):
+    """
+    Пул соединений с ограничением количества соединений: если все заняты,
+    запрос ждет освобождения не дольше timeout. Считает занятые соединения
+    и время ожидания.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name,
+                                                      *keys,
+                                                      **options)
+        finally:
+            wait = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if self.timeout and wait > self.timeout / 2:
+                logging.warning('Waited %.3f s for a redis connection, '
+                                '%s connections are in use',
+                                wait, self.in_use)
+        return connection
+
+    @property
+    def in_use(self) -> int:
+        # Queue holds idle connections and None placeholders for new ones
+        return self.max_connections - self.pool.qsize()
+
+
+class TimedRedis(AsyncRedis):
+    """
+    Клиент Redis, который пишет время каждой команды в метрики
+    """
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(args[0]).observe(
+                time.perf_counter() - start)
+
+
 class Redis(AbstractCache):
-    def __init__(self, **params):
-        self.session = AsyncRedis(**params)
+    def __init__(self,
+                 max_connections: int = 50,
+                 pool_timeout: float = 5,
+                 socket_timeout: float = 5,
+                 socket_connect_timeout: float = 5,
+                 health_check_interval: int = 30,
+                 retries: int = 3,
+                 backoff_base: float = 0.01,
+                 backoff_cap: float = 0.5,
+                 ssl: bool = False,
+                 **params):
+        self.pool = CountingConnectionPool(
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            connection_class=SSLConnection if ssl else Connection,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
+            retry=Retry(ExponentialBackoff(cap=backoff_cap,
+                                           base=backoff_base),
+                        retries),
+            retry_on_error=[ConnectionError, TimeoutError],
+            **params)
+        self.session = TimedRedis(connection_pool=self.pool)
+        # Scripts are registered once, EVALSHA sends only their hash
+        self._pop_and_put = self.session.register_script(POP_AND_PUT_SCRIPT)
+        self._put_to_sorted_set = self.session.register_script(
+            PUT_TO_SORTED_SET_SCRIPT)
+
+    def pool_stats(self) -> dict:
+        return {'max_connections': self.pool.max_connections,
+                'created': len(self.pool._connections),
+                'in_use': self.pool.in_use,
+                'wait_count': self.pool.wait_count,
+                'wait_seconds_total': self.pool.wait_seconds_total,
+                'wait_seconds_max': self.pool.wait_seconds_max}
 
     async def close(self):
-        ...
+        await self.session.close(close_connection_pool=True)
 
     async def get_from_cache_by_id(self, _id: str) -> Optional:
         data = await self.session.get(_id)
@@ -26,9 +141,31 @@ class Redis(AbstractCache):
                                entity,
                                expire)
 
+    async def put_to_cache_by_ids(self, entities: dict, expire):
+        if not entities:
+            return
+        if expire is None:
+            await self.session.mset(entities)
+            return
+        # MSET has no expiration, SETs are sent in one round-trip instead
+        pipe = self.session.pipeline(transaction=False)
+        for _id, entity in entities.items():
+            pipe.set(_id, entity, expire)
+        await pipe.execute()
+
     async def delete_from_cache_by_id(self, _id):
         await self.session.delete(_id)
 
+    async def delete_from_cache_by_ids(self, ids: list):
+        if ids:
+            await self.session.delete(*ids)
+
+    async def pop_and_put_by_id(self, old_id, new_id, entity, expire):
+        # One round-trip (EVALSHA), script is executed atomically by Redis
+        return await self._pop_and_put(keys=[old_id, new_id],
+                                       args=[entity, expire],
+                                       client=self.session)
+
     async def get_from_cache_by_key(self,
                                     model,
                                     key: str = None,
@@ -59,6 +196,28 @@ class Redis(AbstractCache):
         await self.session.expire(name=key,
                                   time=settings.CACHE_EXPIRE_IN_SECONDS)
 
+    async def put_to_sorted_set(self, key: str, member: str) -> float:
+        # Lua numbers are truncated to integers in replies, so score is
+        # returned as a string
+        score = await self._put_to_sorted_set(keys=[key], args=[member],
+                                              client=self.session)
+        return float(score)
+
+    async def get_from_sorted_set(self,
+                                  key: str,
+                                  min_score: float | str = '-inf',
+                                  max_score: float | str = '+inf') -> list:
+        data = await self.session.zrangebyscore(key,
+                                                min_score,
+                                                max_score,
+                                                withscores=True)
+        return [(member.decode(), score) for member, score in data]
+
+    async def delete_from_sorted_set(self,
+                                     key: str,
+                                     max_score: float | str):
+        await self.session.zremrangebyscore(key, '-inf', max_score)
+
 
 redis: Redis | None = None
 
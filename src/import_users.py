@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+import orjson
+import typer
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+
+from core.config import database_dsn
+from models.users import User
+from schemas.users import UserEmail, UserData
+from services.password import hash_password
+
+load_dotenv()
+
+COLUMNS = ('id', 'email', 'password', 'first_name', 'last_name', 'disabled',
+           'created_at')
+STAGING_TABLE = 'users_import'
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class InputFormat(str, Enum):
+    csv = 'csv'
+    jsonl = 'jsonl'
+
+
+def read_users(path: Path, input_format: InputFormat) -> Iterator[dict]:
+    with open(path, newline='', encoding='utf-8') as f:
+        if input_format == InputFormat.csv:
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+
+
+def prepare_row(row: dict, hashed: bool) -> dict | None:
+    """
+    Проверяет запись пользователя
+    :return: значения колонок users или None, если запись некорректна
+    """
+    try:
+        email = UserEmail(email=row.get('email')).email
+        data = UserData(first_name=row.get('first_name') or 'unknown',
+                        last_name=row.get('last_name') or 'unknown',
+                        disabled=row.get('disabled') or False)
+    except ValidationError as e:
+        logging.warning('Skipped %s: %s', row.get('email'), e.errors())
+        return None
+
+    password = row.get('password')
+    if not password or (hashed and not password.startswith(BCRYPT_PREFIXES)):
+        logging.warning('Skipped %s: invalid password', email)
+        return None
+
+    return {'id': uuid.uuid4(),
+            'email': email,
+            'password': password,
+            'first_name': data.first_name,
+            'last_name': data.last_name,
+            'disabled': data.disabled,
+            'created_at': datetime.utcnow()}
+
+
+def copy_chunk(connection, rows: list[dict]) -> int:
+    """
+    Загружает пачку пользователей через COPY во временную таблицу и
+    переносит в users. Пользователи с существующим email пропускаются.
+    :return: количество добавленных пользователей
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in COLUMNS])
+    buffer.seek(0)
+
+    columns = ', '.join(COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+        cursor.copy_expert(f'COPY {STAGING_TABLE} ({columns}) '
+                           f'FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(f'INSERT INTO {User.__table__.fullname} ({columns}) '
+                       f'SELECT {columns} FROM {STAGING_TABLE} '
+                       f'ON CONFLICT DO NOTHING')
+        inserted = cursor.rowcount
+    connection.commit()
+    return inserted
+
+
+def load_checkpoint(checkpoint: Path, source: Path) -> dict:
+    if checkpoint.exists():
+        state = json.loads(checkpoint.read_text())
+        if state.get('source') == str(source):
+            return state
+    return {'source': str(source), 'processed': 0, 'inserted': 0,
+            'skipped': 0}
+
+
+def save_checkpoint(checkpoint: Path, state: dict) -> None:
+    # Written atomically, so an interrupted run never leaves a broken file
+    tmp = checkpoint.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state))
+    tmp.replace(checkpoint)
+
+
+def main(path: Path = typer.Argument(..., exists=True, dir_okay=False,
+                                     help='CSV or JSONL file with users: '
+                                          'email, password, first_name, '
+                                          'last_name, disabled'),
+         input_format: InputFormat = typer.Option(
+             None, '--format',
+             help='Input format, by default taken from the file extension'),
+         hashed: bool = typer.Option(
+             False, help='Passwords are already bcrypt hashes'),
+         chunk_size: int = typer.Option(5000, help='Users per COPY'),
+         workers: int = typer.Option(
+             os.cpu_count(), help='Processes for password hashing'),
+         checkpoint: Path = typer.Option(
+             None, help='Progress file to resume an interrupted import, '
+                        'by default <path>.checkpoint')):
+    """
+    Импорт пользователей из CSV или JSONL. Пароли хешируются в пуле
+    процессов, пользователи загружаются пачками через COPY. После каждой
+    пачки прогресс сохраняется в checkpoint, повторный запуск продолжит
+    импорт с места остановки.
+    """
+    input_format = input_format or InputFormat(path.suffix.lstrip('.'))
+    checkpoint = checkpoint or path.with_name(path.name + '.checkpoint')
+    state = load_checkpoint(checkpoint, path)
+    if state['processed']:
+        logging.info('Resuming after %s users', state['processed'])
+
+    url = f'postgresql://' \
+          f'{database_dsn.user}:{database_dsn.password}@'\
+          f'{database_dsn.host}:{database_dsn.port}/'\
+          f'{database_dsn.dbname}'
+    engine = create_engine(url)
+    connection = engine.raw_connection()
+    pool = None if hashed else ProcessPoolExecutor(max_workers=workers)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMP TABLE {STAGING_TABLE} '
+                           f'(LIKE {User.__table__.fullname})')
+        connection.commit()
+
+        users = islice(read_users(path, input_format),
+                       state['processed'],
+                       None)
+        started = time.monotonic()
+        imported = 0
+        while chunk := list(islice(users, chunk_size)):
+            rows = [row for row in (prepare_row(user, hashed)
+                                    for user in chunk) if row]
+            if pool:
+                hashes = pool.map(hash_password,
+                                  [row['password'] for row in rows],
+                                  chunksize=max(1, len(rows) // workers))
+                for row, password in zip(rows, hashes):
+                    row['password'] = password
+
+            inserted = copy_chunk(connection, rows) if rows else 0
+            imported += len(chunk)
+            state['processed'] += len(chunk)
+            state['inserted'] += inserted
+            state['skipped'] += len(chunk) - inserted
+            save_checkpoint(checkpoint, state)
+            logging.info('Processed %s users: %s inserted, %s skipped, '
+                         '%.0f users/s',
+                         state['processed'], state['inserted'],
+                         state['skipped'],
+                         imported / (time.monotonic() - started))
+        logging.info('Import finished: %s inserted, %s skipped',
+                     state['inserted'], state['skipped'])
+    except ConnectionRefusedError:
+        logging.error("Нет подключения к БД")
+    finally:
+        if pool:
+            pool.shutdown()
+        connection.close()
+
+
+if __name__ == '__main__':
+    typer.run(main)
@@ -7,27 +7,70 @@ from fastapi.responses import ORJSONResponse
 
 from api.v1 import auth, users, roles
 from core.config import settings, database_dsn
+from core import metrics, slow_log, tracing
 from core.logger import LOGGING
 from db import redis, postgres
-from services.token import check_access_token
+from services import history, password
+from services.token import check_access_token, revoked_tokens
 from services.users import check_admin_user
 
 
 async def startup():
-    redis.redis = redis.Redis(host=settings.redis_host,
-                              port=settings.redis_port,
-                              ssl=False)
+    redis.redis = redis.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        ssl=False,
+        max_connections=settings.redis_max_connections,
+        pool_timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        retries=settings.redis_retries,
+        backoff_base=settings.redis_backoff_base,
+        backoff_cap=settings.redis_backoff_cap)
     postgres.postgres = postgres.Postgres(
                       f'postgresql+asyncpg://'
                       f'{database_dsn.user}:{database_dsn.password}@'
                       f'{database_dsn.host}:{database_dsn.port}/'
-                      f'{database_dsn.dbname}')
+                      f'{database_dsn.dbname}',
+                      pool_size=settings.db_pool_size,
+                      max_overflow=settings.db_max_overflow,
+                      pool_timeout=settings.db_pool_timeout,
+                      pool_recycle=settings.db_pool_recycle,
+                      pool_pre_ping=settings.db_pool_pre_ping,
+                      statement_cache_size=settings.db_statement_cache_size)
     postgres.get_session()
+    metrics.instrument_engine(postgres.postgres.engine)
+    tracing.instrument_engine(postgres.postgres.engine)
+    if settings.slow_query_ms:
+        slow_log.SlowQueryLogger(
+            settings.slow_query_ms,
+            settings.slow_log_rate).instrument(postgres.postgres.engine)
+    password.hasher = password.PasswordHasher(
+        executor=settings.password_hash_executor,
+        workers=settings.password_hash_workers,
+        max_queue=settings.password_hash_max_queue)
+    history.writer = history.HistoryWriter(
+        batch_size=settings.history_batch_size,
+        flush_interval=settings.history_flush_interval,
+        max_queue=settings.history_max_queue,
+        user_agents_cache_size=settings.user_agents_cache_size)
+    await history.writer.start(postgres.postgres.async_session)
+    await revoked_tokens.start(redis.redis)
+    metrics.register_stats('redis_pool', redis.redis.pool_stats)
+    metrics.register_stats('db_pool', postgres.postgres.pool_stats)
+    metrics.register_stats('password_hasher', password.hasher.stats)
+    metrics.register_stats('login_history', history.writer.stats)
 
 
 async def shutdown():
+    await revoked_tokens.stop()
+    # Flush login history before the DB engine is disposed
+    await history.writer.stop()
     await redis.redis.close()
     await postgres.postgres.close()
+    await password.hasher.close()
+    tracing.shutdown()
 
 
 @asynccontextmanager
@@ -44,6 +87,20 @@ app = FastAPI(
     openapi_url='/api/openapi.json',
     default_response_class=ORJSONResponse,
     lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+if settings.slow_request_ms or settings.slow_query_ms:
+    # Also gives slow queries their route
+    app.add_middleware(slow_log.SlowRequestMiddleware,
+                       threshold_ms=settings.slow_request_ms or float('inf'),
+                       max_per_second=settings.slow_log_rate)
+app.add_route('/metrics', metrics.metrics_endpoint, include_in_schema=False)
+if settings.tracing_enabled and tracing.setup(
+        settings.project_name,
+        exporter=settings.tracing_exporter,
+        otlp_endpoint=settings.tracing_otlp_endpoint,
+        traces_file=settings.tracing_file,
+        sample_ratio=settings.tracing_sample_ratio):
+    tracing.instrument_app(app)
 
 app.include_router(auth.router, prefix='/api/v1/auth', tags=['auth'])
 app.include_router(roles.router, prefix='/api/v1/roles', tags=['roles'],
@@ -0,0 +1,29 @@
+"""logins_history index for keyset pagination
+
+Revision ID: 8f1c2d7a4b60
+Revises: 34e883ccd463
+Create Date: 2026-10-18 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1c2d7a4b60'
+down_revision = '34e883ccd463'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('logins_history_user_login_time_idx',
+                    'logins_history',
+                    ['user_id',
+                     sa.text('login_time DESC'),
+                     sa.text('id DESC')])
+
+
+def downgrade() -> None:
+    op.drop_index('logins_history_user_login_time_idx',
+                  table_name='logins_history')
@@ -0,0 +1,51 @@
+"""users_roles unique constraint and role_id index
+
+Revision ID: b3e9a1f05c21
+Revises: 8f1c2d7a4b60
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9a1f05c21'
+down_revision = '8f1c2d7a4b60'
+branch_labels = None
+depends_on = None
+
+CONSTRAINT = 'users_roles_user_id_role_id_key'
+# Marks the constraint as created by this revision, the initial migration
+# creates the same one on new databases
+CREATED_HERE = revision
+
+
+def upgrade() -> None:
+    unique_constraints = sa.inspect(op.get_bind()).get_unique_constraints(
+        'users_roles')
+    if not any(c['column_names'] == ['user_id', 'role_id']
+               for c in unique_constraints):
+        # Keep one row of each duplicated (user_id, role_id) pair
+        op.execute('DELETE FROM users_roles a USING users_roles b '
+                   'WHERE a.user_id = b.user_id AND a.role_id = b.role_id '
+                   'AND a.id > b.id')
+        op.create_unique_constraint(CONSTRAINT,
+                                    'users_roles',
+                                    ['user_id', 'role_id'])
+        op.execute(f"COMMENT ON CONSTRAINT {CONSTRAINT} ON users_roles "
+                   f"IS '{CREATED_HERE}'")
+
+    op.create_index('users_roles_role_id_idx', 'users_roles', ['role_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('users_roles_role_id_idx', table_name='users_roles')
+
+    created_here = op.get_bind().execute(sa.text(
+        "SELECT obj_description(oid, 'pg_constraint') = :comment "
+        "FROM pg_constraint "
+        "WHERE conname = :name AND conrelid = 'users_roles'::regclass"),
+        {'comment': CREATED_HERE, 'name': CONSTRAINT}).scalar()
+    if created_here:
+        op.drop_constraint(CONSTRAINT, 'users_roles', type_='unique')
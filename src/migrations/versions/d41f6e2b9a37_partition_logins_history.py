@@ -0,0 +1,100 @@
+"""partition logins_history by month of login_time
+
+Revision ID: d41f6e2b9a37
+Revises: b3e9a1f05c21
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from services.partitions import add_months, create_default_partition, \
+    create_partitions
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6e2b9a37'
+down_revision = 'b3e9a1f05c21'
+branch_labels = None
+depends_on = None
+
+# Partitions created ahead, the rest are created by partitions.py
+MONTHS_AHEAD = 3
+COLUMNS = 'id, user_id, source, login_time, created_at'
+
+
+def _columns(partitioned: bool) -> list:
+    # Same columns as the initial table, which has no foreign key on
+    # user_id: the initial downgrade drops users before logins_history.
+    # Partition key is a part of primary key, so it can't be NULL.
+    return [
+        sa.Column('id', UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', UUID, nullable=False),
+        sa.Column('source', sa.String(255)),
+        sa.Column('login_time', sa.DateTime, nullable=not partitioned),
+        sa.Column('created_at', sa.DateTime),
+    ]
+
+
+def _rename_to_old() -> None:
+    # Index and constraint names must be free for the new table
+    op.rename_table('logins_history', 'logins_history_old')
+    op.execute('DROP INDEX IF EXISTS logins_history_user_login_time_idx')
+    op.execute('ALTER TABLE logins_history_old '
+               'DROP CONSTRAINT IF EXISTS logins_history_pkey, '
+               'DROP CONSTRAINT IF EXISTS logins_history_id_key')
+
+
+def _create_index() -> None:
+    op.create_index('logins_history_user_login_time_idx',
+                    'logins_history',
+                    ['user_id',
+                     sa.text('login_time DESC'),
+                     sa.text('id DESC')])
+
+
+def upgrade() -> None:
+    _rename_to_old()
+    op.create_table('logins_history',
+                    *_columns(partitioned=True),
+                    sa.PrimaryKeyConstraint('id', 'login_time'),
+                    postgresql_partition_by='RANGE (login_time)')
+    _create_index()
+
+    conn = op.get_bind()
+    create_default_partition(conn)
+    this_month = datetime.utcnow().date().replace(day=1)
+    first_login = conn.execute(
+        sa.text('SELECT min(login_time) FROM logins_history_old')).scalar()
+    first_month = first_login.date() if first_login else this_month
+    create_partitions(conn,
+                      min(first_month, this_month),
+                      add_months(this_month, MONTHS_AHEAD))
+
+    # History of deleted users is dropped, as the foreign key would do
+    op.execute(f'INSERT INTO logins_history ({COLUMNS}) '
+               f'SELECT id, user_id, source, '
+               f'coalesce(login_time, created_at, now()), created_at '
+               f'FROM logins_history_old h '
+               f'WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = h.user_id)')
+    op.drop_table('logins_history_old')
+    # Added after the data is copied, so it is validated once
+    op.create_foreign_key('logins_history_user_id_fkey',
+                          'logins_history', 'users',
+                          ['user_id'], ['id'],
+                          ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    _rename_to_old()
+    op.create_table('logins_history',
+                    *_columns(partitioned=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('id'))
+    _create_index()
+    op.execute(f'INSERT INTO logins_history ({COLUMNS}) '
+               f'SELECT {COLUMNS} FROM logins_history_old')
+    # Drops all partitions as well
+    op.drop_table('logins_history_old')
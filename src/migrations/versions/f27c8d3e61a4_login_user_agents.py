@@ -0,0 +1,34 @@
+"""user_agents lookup table for logins_history
+
+Revision ID: f27c8d3e61a4
+Revises: d41f6e2b9a37
+Create Date: 2026-10-18 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f27c8d3e61a4'
+down_revision = 'd41f6e2b9a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_agents',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('value', sa.String(512), unique=True, nullable=False),
+    )
+    # Added to all partitions of logins_history
+    op.add_column('logins_history',
+                  sa.Column('user_agent_id',
+                            sa.Integer,
+                            sa.ForeignKey('user_agents.id')))
+
+
+def downgrade() -> None:
+    op.drop_column('logins_history', 'user_agent_id')
+    op.drop_table('user_agents')
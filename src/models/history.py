@@ -1,29 +1,68 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, String, ForeignKey
+from sqlalchemy import Column, DateTime, String, ForeignKey, Index, \
+    Integer, DDL, event
 from sqlalchemy.dialects.postgresql import UUID
 from passlib.context import CryptContext
 from db.postgres import Base
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Longer user agents are truncated
+USER_AGENT_MAX_LENGTH = 512
+
+
+class UserAgent(Base):
+    """
+    Справочник user agent: в истории логинов хранится только id
+    """
+    __tablename__ = 'user_agents'
+
+    id = Column(Integer, primary_key=True)
+    value = Column(String(USER_AGENT_MAX_LENGTH), unique=True, nullable=False)
+
 
 class LoginHistory(Base):
     __tablename__ = 'logins_history'
 
+    # Unique constraints of a partitioned table must include the partition
+    # key, so the primary key is (id, login_time)
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4,
-                unique=True, nullable=False)
+                nullable=False)
     user_id = Column(UUID,
                      ForeignKey('users.id', ondelete='CASCADE'),
                      nullable=False)
+    # Client IP address
     source = Column(String(255), default=None)
-    login_time = Column(DateTime, default=datetime.utcnow)
+    user_agent_id = Column(Integer,
+                           ForeignKey('user_agents.id'),
+                           default=None)
+    login_time = Column(DateTime, primary_key=True, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination of user's history: WHERE user_id = ... AND
+    # (login_time, id) < (...) ORDER BY login_time DESC, id DESC
+    __table_args__ = (
+        Index('logins_history_user_login_time_idx',
+              'user_id',
+              login_time.desc(),
+              id.desc()),
+        # Monthly partitions are managed by partitions.py
+        {'postgresql_partition_by': 'RANGE (login_time)'},
+    )
+
     def __init__(self,
                  user_id: UUID,
                  source: str = None) -> None:
         self.user_id = user_id
         self.source = source
         self.login_time = self.login_time
+
+
+# Tables created with metadata.create_all need a partition to insert into
+event.listen(
+    LoginHistory.__table__,
+    'after_create',
+    DDL('CREATE TABLE IF NOT EXISTS %(schema)s.%(table)s_default '
+        'PARTITION OF %(fullname)s DEFAULT'))
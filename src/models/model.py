@@ -33,6 +33,10 @@ class PaginateModel:
                                         description=conf.SIZE_DESC,
                                         ge=1,
                                         le=500),
+                 cursor: str | None = Query(None,
+                                            description=conf.CURSOR_DESC,
+                                            max_length=200),
                  ):
         self.page_number = page_number
         self.page_size = page_size
+        self.cursor = cursor
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from sqlalchemy import Column, DateTime, String, Integer, ForeignKey, \
-    UniqueConstraint
+    Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 
 from db.postgres import Base
@@ -36,8 +36,17 @@ class UserRole(Base):
     role_id = Column(UUID,
                      ForeignKey('roles.id', ondelete='CASCADE'),
                      nullable=False)
+    # Used by the initial migration only, the model's constraint is the
+    # named one in __table_args__
     user_role_idx = UniqueConstraint('user_id', 'role_id')
 
+    # The unique constraint also serves lookups by user_id
+    __table_args__ = (
+        UniqueConstraint('user_id', 'role_id',
+                         name='users_roles_user_id_role_id_key'),
+        Index('users_roles_role_id_idx', 'role_id'),
+    )
+
     def __init__(self, user_id: UUID, role_id: UUID) -> None:
         self.user_id = user_id
         self.role_id = role_id
@@ -3,11 +3,8 @@ from datetime import datetime
 
 from sqlalchemy import Column, DateTime, String, Boolean
 from sqlalchemy.dialects.postgresql import UUID
-from passlib.context import CryptContext
 from db.postgres import Base
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class User(Base):
     __tablename__ = 'users'
@@ -28,7 +25,8 @@ class User(Base):
                  last_name: str = None,
                  disabled: bool = False) -> None:
         self.email = email
-        self.password = pwd_context.hash(password)
+        # Password must be hashed before, see services.password
+        self.password = password
         self.first_name = first_name if first_name else ""
         self.last_name = last_name if last_name else ""
         self.disabled = disabled
@@ -0,0 +1,69 @@
+import os
+import logging
+from datetime import datetime
+
+from sqlalchemy import create_engine
+import typer
+
+from dotenv import load_dotenv
+
+from core.config import database_dsn
+from services.partitions import add_months, create_partitions, \
+    remove_default_rows, remove_partitions
+
+load_dotenv()
+
+
+def main(months_ahead: int = typer.Option(
+             3,
+             envvar='HISTORY_MONTHS_AHEAD',
+             help='Months to create partitions for in advance'),
+         retention_months: int = typer.Option(
+             12,
+             envvar='HISTORY_RETENTION_MONTHS',
+             help='Months of login history to keep, 0 keeps everything'),
+         archive: bool = typer.Option(
+             False,
+             help='Detach expired partitions instead of dropping them')):
+    """
+    Обслуживание партиций logins_history: создает партиции на months_ahead
+    месяцев вперед и удаляет (или отсоединяет) партиции старше
+    retention_months месяцев, а также строки старше retention_months из
+    партиции по умолчанию. Запускать по cron раз в день.
+    """
+    try:
+        logging.info('Maintaining logins_history partitions...')
+        url = f'postgresql://' \
+              f'{database_dsn.user}:{database_dsn.password}@'\
+              f'{database_dsn.host}:{database_dsn.port}/'\
+              f'{database_dsn.dbname}'
+        echo = (os.getenv('ENGINE_ECHO', 'False') == 'True')
+        engine = create_engine(url, echo=echo)
+
+        this_month = datetime.utcnow().date().replace(day=1)
+        with engine.begin() as conn:
+            created = create_partitions(conn,
+                                        this_month,
+                                        add_months(this_month, months_ahead))
+            removed = []
+            deleted = 0
+            if retention_months:
+                before = add_months(this_month, 1 - retention_months)
+                removed = remove_partitions(conn,
+                                            before=before,
+                                            archive=archive)
+                # Expired rows of the default partition are deleted even
+                # with --archive
+                deleted = remove_default_rows(conn, before)
+        logging.info('Created partitions: %s', created)
+        logging.info('%s partitions: %s',
+                     'Detached' if archive else 'Dropped',
+                     removed)
+        logging.info('Deleted %s expired rows of the default partition',
+                     deleted)
+    except ConnectionRefusedError:
+        logging.error("Нет подключения к БД")
+
+
+if __name__ == '__main__':
+    typer.run(main)
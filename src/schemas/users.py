@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel, Field, EmailStr, constr
+from pydantic import BaseModel, Field, EmailStr, conlist, constr
 from core import config
 
 password_regex = "^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d]{8,}$"
@@ -57,7 +57,20 @@ class UserRoleInDB(UserRoleCreate):
     id: UUID
 
 
+class UserRolesBulk(BaseModel):
+    items: conlist(UserRoleCreate,
+                   min_items=1,
+                   max_items=config.BULK_MAX_ITEMS)
+
+
+class UserRoleBulkResult(UserRoleCreate):
+    # created, exists, deleted, not_found, user_not_found, role_not_found
+    status: str
+    id: UUID = None
+
+
 class UserHistory(BaseModel):
     user_id: UUID
     source: str = None
+    user_agent: str = None
     login_time: datetime
@@ -18,6 +18,12 @@ access_token_invalid_exception = HTTPException(
             headers={"WWW-Authenticate": "Bearer"},
 )
 
+permissions_changed_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Permissions were changed. Create new token with /refresh",
+            headers={"WWW-Authenticate": "Bearer"},
+)
+
 
 wrong_username_or_password = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,6 +31,16 @@ wrong_username_or_password = HTTPException(
             headers={"WWW-Authenticate": "Bearer"},
 )
 
+service_busy_exception = HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is busy. Please try again later.",
+)
+
+invalid_cursor_exception = HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+)
+
 
 def entity_doesnt_exist(name: str, value: str) -> HTTPException:
     return HTTPException(
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from models.history import USER_AGENT_MAX_LENGTH
+from services.local_cache import LocalCache
+from services.repositories.history import HistoryRepository
+
+
+def _is_row_error(error: DBAPIError) -> bool:
+    """
+    Ошибка из-за данных записи: нарушение ограничения (SQLSTATE 23xxx) или
+    недопустимое значение (22xxx), например удаленный пользователь или
+    слишком длинная строка
+    """
+    # asyncpg errors other than integrity violations are translated to the
+    # generic DBAPIError, so check the SQLSTATE class
+    return str(getattr(error.orig, 'sqlstate', '')).startswith(('22', '23'))
+
+
+class HistoryWriter:
+    """
+    Пишет историю логинов в фоне: записи копятся в очереди и вставляются в
+    DB пачками до batch_size записей не реже раза в flush_interval секунд.
+    Если очередь заполнена, запись вставляется сразу, замедляя логин, но не
+    теряя историю. User agent хранится в справочнике user_agents, id
+    частых user agent кэшируются.
+    """
+    def __init__(self,
+                 batch_size: int = 500,
+                 flush_interval: float = 0.5,
+                 max_queue: int = 10000,
+                 user_agents_cache_size: int = 1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(max_queue)
+        self.written = 0
+        self.failed = 0
+        self.inline_writes = 0
+        self.user_agents = LocalCache(maxsize=user_agents_cache_size)
+        self._session_maker: async_sessionmaker | None = None
+        self._task: asyncio.Task | None = None
+
+    async def add(self,
+                  user_id: uuid.UUID,
+                  source: str = None,
+                  user_agent: str = None) -> None:
+        now = datetime.utcnow()
+        row = {'id': uuid.uuid4(),
+               'user_id': user_id,
+               'source': source,
+               'user_agent': (user_agent[:USER_AGENT_MAX_LENGTH]
+                              if user_agent else None),
+               'login_time': now,
+               'created_at': now}
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.inline_writes += 1
+            await self._write([row])
+
+    async def _set_user_agent_ids(self,
+                                  session: AsyncSession,
+                                  rows: list[dict]) -> None:
+        """
+        Заменяет user agent в записях на id из справочника, добавляя в него
+        новые значения
+        """
+        ids = {}
+        missing = set()
+        for row in rows:
+            user_agent = row['user_agent']
+            if user_agent and user_agent not in ids:
+                ids[user_agent] = self.user_agents.get(user_agent)
+                if ids[user_agent] is None:
+                    missing.add(user_agent)
+
+        if missing:
+            added = await HistoryRepository(session).get_user_agent_ids(
+                list(missing))
+            for value, _id in added.items():
+                ids[value] = _id
+                self.user_agents.put(value, _id)
+
+        for row in rows:
+            user_agent = row.pop('user_agent')
+            row['user_agent_id'] = ids[user_agent] if user_agent else None
+
+    async def _write(self, rows: list[dict]) -> None:
+        try:
+            async with self._session_maker() as session:
+                await self._set_user_agent_ids(session, rows)
+                # Committed apart from the history, so cached ids stay
+                # valid if the history insert fails
+                await session.commit()
+        except Exception:
+            self.failed += len(rows)
+            logging.exception('Failed to write %s login history rows',
+                              len(rows))
+            return
+        await self._insert(rows)
+
+    async def _insert(self, rows: list[dict]) -> None:
+        """
+        Вставляет записи одним запросом. Если запрос не прошел из-за
+        данных одной из записей, записи вставляются по половинам, чтобы
+        потерять только ошибочные.
+        """
+        try:
+            async with self._session_maker() as session:
+                # executemany with a single prepared statement
+                await HistoryRepository(session).add_many(rows)
+            self.written += len(rows)
+        except DBAPIError as e:
+            if not _is_row_error(e):
+                self.failed += len(rows)
+                logging.exception('Failed to write %s login history rows',
+                                  len(rows))
+            elif len(rows) == 1:
+                self.failed += 1
+                logging.error('Failed to write login history of user %s: %s',
+                              rows[0]['user_id'], e.orig)
+            else:
+                middle = len(rows) // 2
+                await self._insert(rows[:middle])
+                await self._insert(rows[middle:])
+        except Exception:
+            self.failed += len(rows)
+            logging.exception('Failed to write %s login history rows',
+                              len(rows))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self.queue.get()
+            if row is None:
+                break
+
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._write(batch)
+
+    def stats(self) -> dict:
+        return {'queued': self.queue.qsize(),
+                'written': self.written,
+                'failed': self.failed,
+                'inline_writes': self.inline_writes}
+
+    async def start(self, session_maker: async_sessionmaker) -> None:
+        self._session_maker = session_maker
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Записывает оставшиеся в очереди записи и останавливает воркер
+        """
+        if self._task:
+            await self.queue.put(None)
+            await self._task
+            self._task = None
+
+
+writer: HistoryWriter | None = None
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LocalCache:
+    """
+    Ограниченный по размеру LRU кэш в памяти процесса. У каждой записи есть
+    время жизни: по умолчанию ttl секунд, либо явный момент истечения
+    expire_at (unix timestamp).
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = \
+            OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        value, expire_at = item
+        if expire_at is not None and expire_at <= time.time():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def put(self,
+            key: Hashable,
+            value: Any,
+            ttl: float | None = None,
+            expire_at: float | None = None) -> None:
+        if expire_at is None:
+            ttl = ttl if ttl is not None else self.ttl
+            expire_at = time.time() + ttl if ttl is not None else None
+
+        self._data[key] = (value, expire_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return item[0] if item is not None else default
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
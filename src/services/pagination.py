@@ -0,0 +1,29 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+from services.exceptions import invalid_cursor_exception
+
+
+def encode_cursor(login_time: datetime, _id: UUID) -> str:
+    """
+    Непрозрачный курсор для keyset пагинации по (login_time, id)
+    :param login_time: время последней записи на странице
+    :param _id: id последней записи на странице
+    """
+    raw = f'{login_time.isoformat()}|{_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """
+    Разбирает курсор, созданный encode_cursor
+    :param cursor: курсор из запроса
+    :return: (login_time, id)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        login_time, _id = raw.decode().split('|')
+        return datetime.fromisoformat(login_time), UUID(_id)
+    except ValueError:
+        raise invalid_cursor_exception
@@ -0,0 +1,125 @@
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from models.history import LoginHistory
+
+# logins_history is partitioned by month of login_time: partitions are named
+# logins_history_YYYY_MM, rows outside of them go to logins_history_default
+TABLE = LoginHistory.__tablename__
+SCHEMA = LoginHistory.__table__.schema
+DEFAULT_PARTITION = f'{TABLE}_default'
+_PARTITION_RE = re.compile(rf'^{TABLE}_(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def get_partitions(conn: Connection) -> dict[date, str]:
+    """
+    Месячные партиции logins_history
+    :param conn: подключение к DB
+    :return: {первый день месяца: имя партиции}
+    """
+    response = conn.execute(
+        text('SELECT c.relname FROM pg_inherits i '
+             'JOIN pg_class c ON c.oid = i.inhrelid '
+             'WHERE i.inhparent = CAST(:table AS regclass)'),
+        {'table': f'{SCHEMA}.{TABLE}'})
+    partitions = {}
+    for name in response.scalars():
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_default_partition(conn: Connection) -> None:
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS '
+                      f'{SCHEMA}.{DEFAULT_PARTITION} '
+                      f'PARTITION OF {SCHEMA}.{TABLE} DEFAULT'))
+
+
+def create_partition(conn: Connection, month: date) -> str:
+    """
+    Создает партицию за месяц. Строки этого месяца, уже попавшие в
+    партицию по умолчанию, переносятся в новую партицию.
+    :param conn: подключение к DB
+    :param month: первый день месяца
+    :return: имя партиции
+    """
+    name = partition_name(month)
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    conn.execute(text(f'CREATE TABLE {SCHEMA}.{name} '
+                      f'(LIKE {SCHEMA}.{TABLE} INCLUDING DEFAULTS)'))
+    # Postgres refuses to attach a partition while the default partition
+    # holds rows of its range
+    conn.execute(text(f'WITH moved AS ('
+                      f'DELETE FROM {SCHEMA}.{DEFAULT_PARTITION} '
+                      f'WHERE login_time >= :start AND login_time < :end '
+                      f'RETURNING *) '
+                      f'INSERT INTO {SCHEMA}.{name} SELECT * FROM moved'),
+                 bounds)
+    conn.execute(text(f"ALTER TABLE {SCHEMA}.{TABLE} "
+                      f"ATTACH PARTITION {SCHEMA}.{name} "
+                      f"FOR VALUES FROM ('{bounds['start']}') "
+                      f"TO ('{bounds['end']}')"))
+    return name
+
+
+def create_partitions(conn: Connection,
+                      first_month: date,
+                      last_month: date) -> list[str]:
+    """
+    Создает недостающие партиции с first_month по last_month включительно
+    :return: имена созданных партиций
+    """
+    existing = get_partitions(conn)
+    created = []
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        if month not in existing:
+            created.append(create_partition(conn, month))
+        month = add_months(month, 1)
+    return created
+
+
+def remove_partitions(conn: Connection,
+                      before: date,
+                      archive: bool = False) -> list[str]:
+    """
+    Удаляет партиции за месяцы раньше before. При archive=True партиции
+    только отсоединяются и остаются отдельными таблицами для архивации.
+    :return: имена удаленных или отсоединенных партиций
+    """
+    removed = []
+    for month, name in sorted(get_partitions(conn).items()):
+        if month >= before:
+            break
+        if archive:
+            conn.execute(text(f'ALTER TABLE {SCHEMA}.{TABLE} '
+                              f'DETACH PARTITION {SCHEMA}.{name}'))
+        else:
+            conn.execute(text(f'DROP TABLE {SCHEMA}.{name}'))
+        removed.append(name)
+    return removed
+
+
+def remove_default_rows(conn: Connection, before: date) -> int:
+    """
+    Удаляет строки раньше before из партиции по умолчанию: туда попадают
+    логины за месяцы, партиции которых еще не были созданы
+    :return: количество удаленных строк
+    """
+    response = conn.execute(text(f'DELETE FROM {SCHEMA}.{DEFAULT_PARTITION} '
+                                 f'WHERE login_time < :before'),
+                            {'before': before})
+    return response.rowcount
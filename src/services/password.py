@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from core.metrics import timed
+from services.exceptions import service_busy_exception
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Module level functions, so they can be pickled by ProcessPoolExecutor
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt хеширование и проверку паролей в пуле воркеров, чтобы не
+    блокировать event loop. Количество одновременных операций ограничено
+    размером пула, а очередь ожидающих - max_queue.
+    """
+    def __init__(self,
+                 executor: str = 'thread',
+                 workers: int = 4,
+                 max_queue: int = 100):
+        if executor == 'process':
+            self.executor: Executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            # bcrypt releases the GIL, so threads are enough in most cases
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='password-hasher')
+        self.workers = workers
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(workers)
+        self.in_progress = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self.max_queue and self.waiting >= self.max_queue:
+            self.rejected += 1
+            logging.warning('Password hasher queue is full: %s waiting',
+                            self.waiting)
+            raise service_busy_exception
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_progress += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_progress -= 1
+            self._semaphore.release()
+
+    @timed('bcrypt_hash')
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    @timed('bcrypt_verify')
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password,
+                               plain_password,
+                               hashed_password)
+
+    def stats(self) -> dict:
+        return {'workers': self.workers,
+                'in_progress': self.in_progress,
+                'waiting': self.waiting,
+                'rejected': self.rejected}
+
+    async def close(self):
+        # Waiting for running jobs in a thread, so the loop isn't blocked
+        await asyncio.to_thread(self.executor.shutdown, True)
+
+
+hasher: PasswordHasher | None = None
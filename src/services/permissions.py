@@ -0,0 +1,86 @@
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db import AbstractCache
+from services.repositories.roles import RoleRepository
+
+# Access token claims with user's permissions
+PERMISSIONS_CLAIM = 'prm'
+VERSION_CLAIM = 'pv'
+
+
+def _permissions_key(user_id) -> str:
+    return f'permissions:{user_id}'
+
+
+def _version_key(user_id) -> str:
+    return f'permissions-version:{user_id}'
+
+
+async def get_user_permissions(db: AsyncSession,
+                               cache: AbstractCache,
+                               user_id: str) -> int:
+    """
+    Максимальные permissions среди всех ролей пользователя. Результат
+    хранится в кэше как 'permissions:<user_id>' : '<permissions>'
+    :param db: подключение к DB
+    :param cache: подключение к кэшу
+    :param user_id: id пользователя
+    :return: permissions, 0 если у пользователя нет ролей
+    """
+    cached = await cache.get_from_cache_by_id(_permissions_key(user_id))
+    if cached is not None:
+        return int(cached)
+
+    permissions = await RoleRepository(db).get_user_permissions(user_id)
+    await cache.put_to_cache_by_id(_id=_permissions_key(user_id),
+                                   entity=permissions,
+                                   expire=settings.permissions_cache_expire)
+    return permissions
+
+
+async def get_permissions_version(cache: AbstractCache, user_id: str) -> int:
+    """
+    Версия permissions пользователя. Меняется при каждом изменении его ролей,
+    0 если роли не менялись.
+    :param cache: подключение к кэшу
+    :param user_id: id пользователя
+    """
+    version = await cache.get_from_cache_by_id(_version_key(user_id))
+    return int(version) if version is not None else 0
+
+
+async def get_permissions_claims(db: AsyncSession,
+                                 cache: AbstractCache,
+                                 user_id: str) -> dict:
+    """
+    Claims для access token: permissions пользователя и их версия
+    :param db: подключение к DB
+    :param cache: подключение к кэшу
+    :param user_id: id пользователя
+    """
+    # Version is read first: if roles change while permissions are
+    # calculated the token will carry the old version and will be rejected.
+    version = await get_permissions_version(cache, user_id)
+    permissions = await get_user_permissions(db, cache, user_id)
+    return {PERMISSIONS_CLAIM: permissions, VERSION_CLAIM: version}
+
+
+async def invalidate_user_permissions(cache: AbstractCache,
+                                      user_ids: list) -> None:
+    """
+    Удаляет из кэша permissions пользователей, роли которых изменились, и
+    меняет версию их permissions, чтобы выданные токены стали недействительны
+    :param cache: подключение к кэшу
+    :param user_ids: список id пользователей
+    """
+    await cache.delete_from_cache_by_ids(
+        [_permissions_key(user_id) for user_id in user_ids])
+
+    # Version keys are never expired: any token may still carry the version
+    version = time.time_ns()
+    await cache.put_to_cache_by_ids(
+        {_version_key(user_id): version for user_id in user_ids},
+        expire=None)
@@ -0,0 +1,52 @@
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.postgres import Base
+
+# Type of a list of ids sent as a single parameter: `id = ANY(:ids)` keeps
+# one statement for any number of ids
+UUID_ARRAY = ARRAY(UUID(as_uuid=True))
+
+
+async def insert_or_none(db: AsyncSession,
+                         model: type[Base],
+                         values: dict) -> Base | None:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING: вставка и проверка
+    уникальности за один запрос, без гонки между проверкой и вставкой
+    :param db: подключение к DB
+    :param model: модель таблицы
+    :param values: значения колонок
+    :return: созданная запись или None, если такая запись уже есть
+    """
+    response = await db.execute(
+        insert(model).
+        values(**values).
+        on_conflict_do_nothing().
+        returning(model)
+    )
+    return response.scalars().first()
+
+
+async def update_returning(db: AsyncSession,
+                           model: type[Base],
+                           where: list,
+                           values: dict) -> Base | None:
+    """
+    UPDATE ... RETURNING: изменение и чтение записи за один запрос.
+    Нарушение уникальности приводит к IntegrityError.
+    :param db: подключение к DB
+    :param model: модель таблицы
+    :param where: условия WHERE
+    :param values: новые значения колонок
+    :return: измененная запись или None, если запись не найдена
+    """
+    response = await db.execute(
+        update(model).
+        where(*where).
+        values(**values).
+        returning(model).
+        execution_options(synchronize_session=False)
+    )
+    return response.scalars().first()
@@ -0,0 +1,84 @@
+from datetime import datetime
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import insert, lambda_stmt, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.history import LoginHistory, UserAgent
+from services.database import DbDep
+
+# Statements without parameters in SQL, executed with executemany
+_insert_history = insert(LoginHistory)
+_insert_user_agents = pg_insert(UserAgent). \
+    on_conflict_do_nothing(index_elements=['value'])
+
+
+class HistoryRepository:
+    """
+    Запросы к таблицам logins_history и user_agents
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_page(self,
+                       user_id,
+                       page_size: int,
+                       offset: int = 0,
+                       cursor: tuple[datetime, UUID] = None) -> list[Row]:
+        """
+        Страница истории логинов, сначала последние
+        :param user_id: id пользователя
+        :param page_size: размер страницы
+        :param offset: количество пропускаемых записей, если нет cursor
+        :param cursor: (login_time, id) последней записи предыдущей страницы
+        :return: строки (LoginHistory, user agent)
+        """
+        stmt = lambda_stmt(
+            lambda: select(LoginHistory, UserAgent.value).
+            outerjoin(UserAgent, UserAgent.id == LoginHistory.user_agent_id).
+            where(LoginHistory.user_id == user_id).
+            order_by(LoginHistory.login_time.desc(),
+                     LoginHistory.id.desc()).
+            limit(page_size))
+        if cursor:
+            # Keyset pagination: deep pages cost the same as the first one
+            login_time, history_id = cursor
+            stmt += lambda s: s.where(
+                tuple_(LoginHistory.login_time, LoginHistory.id) <
+                tuple_(login_time, history_id))
+        else:
+            stmt += lambda s: s.offset(offset)
+        response = await self.db.execute(stmt)
+        return list(response.all())
+
+    async def get_user_agent_ids(self, values: list[str]) -> dict[str, int]:
+        """
+        Id user agent из справочника, новые значения добавляются
+        :param values: user agent
+        :return: {user agent: id}
+        """
+        # Sorted, so concurrent writers lock rows in the same order
+        values = sorted(values)
+        await self.db.execute(_insert_user_agents,
+                              [{'value': value} for value in values])
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(UserAgent.id, UserAgent.value).
+            where(UserAgent.value.in_(values))))
+        return {value: _id for _id, value in response}
+
+    async def add_many(self, rows: list[dict]) -> None:
+        await self.db.execute(_insert_history, rows)
+        await self.db.commit()
+
+
+def get_history_repository(db: DbDep) -> HistoryRepository:
+    return HistoryRepository(db)
+
+
+HistoryRepositoryDep = Annotated[HistoryRepository,
+                                 Depends(get_history_repository)]
@@ -0,0 +1,186 @@
+from typing import Annotated
+
+from fastapi import Depends
+import uuid
+
+from sqlalchemy import any_, delete, exists, func, lambda_stmt, type_coerce
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.roles import Role, UserRole
+from services.database import DbDep
+from services.repositories import UUID_ARRAY, insert_or_none, \
+    update_returning
+
+
+class RoleRepository:
+    """
+    Запросы к таблицам roles и users_roles
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_all(self) -> list[Role]:
+        response = await self.db.execute(lambda_stmt(lambda: select(Role)))
+        return list(response.scalars().all())
+
+    async def get_titles_permissions(self) -> dict[str, int]:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(Role.title, Role.permissions)))
+        return {title: permissions for title, permissions in response}
+
+    async def exists(self, role_id) -> bool:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(exists().where(Role.id == role_id))))
+        return response.scalar()
+
+    async def get_existing_ids(self, role_ids: list) -> set:
+        """
+        :return: id из role_ids, для которых есть роль
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(Role.id).
+            where(Role.id == any_(type_coerce(role_ids, UUID_ARRAY)))))
+        return set(response.scalars().all())
+
+    async def create(self, values: dict) -> Role | None:
+        """
+        :return: созданная роль или None, если title уже занят
+        """
+        role = await insert_or_none(self.db, Role, values)
+        await self.db.commit()
+        return role
+
+    async def update(self, role_id, values: dict) -> Role | None:
+        """
+        :return: измененная роль или None, если роль не найдена. Если title
+        занят, IntegrityError.
+        """
+        role = await update_returning(self.db,
+                                      Role,
+                                      [Role.id == role_id],
+                                      values)
+        await self.db.commit()
+        return role
+
+    async def delete(self, role_id) -> bool:
+        """
+        :return: False, если роль не найдена
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: delete(Role).where(Role.id == role_id).
+            returning(Role.id).
+            execution_options(synchronize_session=False)))
+        deleted = response.first() is not None
+        await self.db.commit()
+        return deleted
+
+    async def get_users(self, role_id) -> list:
+        """
+        :return: id пользователей с ролью
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(UserRole.user_id).
+            where(UserRole.role_id == role_id)))
+        return list(response.scalars().all())
+
+    async def get_user_roles(self, user_id) -> list[Role]:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(Role).
+            join(UserRole, UserRole.role_id == Role.id).
+            where(UserRole.user_id == user_id)))
+        return list(response.scalars().all())
+
+    async def get_user_permissions(self, user_id) -> int:
+        """
+        :return: максимальные permissions среди ролей пользователя, 0 если
+        ролей нет
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(func.max(Role.permissions)).
+            join(UserRole, UserRole.role_id == Role.id).
+            where(UserRole.user_id == user_id)))
+        return response.scalar() or 0
+
+    async def add_user_role(self, user_id, role_id) -> UserRole:
+        """
+        Если роль уже есть у пользователя или пользователь либо роль не
+        найдены, IntegrityError.
+        """
+        user_role = UserRole(user_id, role_id)
+        self.db.add(user_role)
+        await self.db.commit()
+        return user_role
+
+    async def delete_user_role(self, user_id, role_id) -> bool:
+        """
+        :return: False, если у пользователя нет такой роли
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: delete(UserRole).
+            where(UserRole.user_id == user_id,
+                  UserRole.role_id == role_id).
+            returning(UserRole.id).
+            execution_options(synchronize_session=False)))
+        deleted = response.first() is not None
+        await self.db.commit()
+        return deleted
+
+    async def add_user_roles(self,
+                             pairs: list[tuple]) -> dict[tuple, uuid.UUID]:
+        """
+        Добавляет роли пользователям одним запросом. Уже существующие пары
+        пропускаются. Если пользователь или роль не найдены, IntegrityError.
+        :param pairs: [(user_id, role_id)]
+        :return: {(user_id, role_id): id} для добавленных пар
+        """
+        ids = [uuid.uuid4() for _ in pairs]
+        user_ids = [user_id for user_id, _ in pairs]
+        role_ids = [role_id for _, role_id in pairs]
+        response = await self.db.execute(lambda_stmt(
+            lambda: insert(UserRole).
+            from_select(['id', 'user_id', 'role_id'],
+                        select(func.unnest(type_coerce(ids, UUID_ARRAY)),
+                               func.unnest(type_coerce(user_ids, UUID_ARRAY)),
+                               func.unnest(type_coerce(role_ids,
+                                                       UUID_ARRAY)))).
+            on_conflict_do_nothing().
+            returning(UserRole.id, UserRole.user_id, UserRole.role_id)))
+        added = {(user_id, role_id): _id
+                 for _id, user_id, role_id in response}
+        await self.db.commit()
+        return added
+
+    async def delete_user_roles(self, pairs: list[tuple]) -> set[tuple]:
+        """
+        Удаляет роли у пользователей одним запросом
+        :param pairs: [(user_id, role_id)]
+        :return: удаленные пары (user_id, role_id)
+        """
+        user_ids = [user_id for user_id, _ in pairs]
+        role_ids = [role_id for _, role_id in pairs]
+
+        def stmt():
+            rows = select(
+                func.unnest(type_coerce(user_ids, UUID_ARRAY)).
+                label('user_id'),
+                func.unnest(type_coerce(role_ids, UUID_ARRAY)).
+                label('role_id')).subquery()
+            return delete(UserRole). \
+                where(UserRole.user_id == rows.c.user_id,
+                      UserRole.role_id == rows.c.role_id). \
+                returning(UserRole.user_id, UserRole.role_id). \
+                execution_options(synchronize_session=False)
+
+        response = await self.db.execute(lambda_stmt(stmt))
+        deleted = {(user_id, role_id) for user_id, role_id in response}
+        await self.db.commit()
+        return deleted
+
+
+def get_role_repository(db: DbDep) -> RoleRepository:
+    return RoleRepository(db)
+
+
+RoleRepositoryDep = Annotated[RoleRepository, Depends(get_role_repository)]
@@ -0,0 +1,74 @@
+from typing import Annotated
+
+from fastapi import Depends
+from sqlalchemy import any_, exists, lambda_stmt, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.users import User
+from services.database import DbDep
+from services.repositories import UUID_ARRAY, insert_or_none, \
+    update_returning
+
+
+class UserRepository:
+    """
+    Запросы к таблице users. Запросы построены через lambda_stmt: SQL
+    компилируется один раз, а при следующих вызовах меняются только
+    параметры.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, user_id) -> User | None:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(User).where(User.id == user_id)))
+        return response.scalars().first()
+
+    async def get_by_email(self, email: str) -> User | None:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(User).where(User.email == email)))
+        return response.scalars().first()
+
+    async def exists(self, user_id) -> bool:
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(exists().where(User.id == user_id))))
+        return response.scalar()
+
+    async def get_existing_ids(self, user_ids: list) -> set:
+        """
+        :return: id из user_ids, для которых есть пользователь
+        """
+        response = await self.db.execute(lambda_stmt(
+            lambda: select(User.id).
+            where(User.id == any_(type_coerce(user_ids, UUID_ARRAY)))))
+        return set(response.scalars().all())
+
+    async def create(self, values: dict) -> User | None:
+        """
+        :return: созданный пользователь или None, если email уже занят
+        """
+        user = await insert_or_none(self.db, User, values)
+        await self.db.commit()
+        return user
+
+    async def update_login(self,
+                           user_id,
+                           email: str,
+                           password: str) -> User | None:
+        """
+        Меняет email и хэш пароля. Если email занят, IntegrityError.
+        """
+        user = await update_returning(self.db,
+                                      User,
+                                      [User.id == user_id],
+                                      {'email': email, 'password': password})
+        await self.db.commit()
+        return user
+
+
+def get_user_repository(db: DbDep) -> UserRepository:
+    return UserRepository(db)
+
+
+UserRepositoryDep = Annotated[UserRepository, Depends(get_user_repository)]
@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from hashlib import blake2b
+
+from db import AbstractCache
+
+# Sorted set 'revoked-access-tokens' : {<token id>: <revocation timestamp>}.
+# Used by workers to fetch revocations made by other workers. Timestamps are
+# assigned by Redis and grow with every revocation, so a revocation can't
+# land below the score a worker has already synced to.
+REVOKED_SET_KEY = 'revoked-access-tokens'
+
+
+class BloomFilter:
+    """
+    Bloom filter: без ложноотрицательных ответов, доля ложноположительных
+    около error_rate при количестве элементов не больше capacity.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) /
+                               math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(item))
+
+
+class RevocationList:
+    """
+    Локальная копия списка отозванных access-token в виде bloom filter.
+    Только при попадании в фильтр нужно проверять токен в Redis. Фильтр
+    дополняется отзывами других воркеров раз в sync_interval секунд и
+    пересобирается раз в max_age секунд (время жизни access-token), чтобы
+    убрать истекшие токены.
+    """
+    def __init__(self,
+                 capacity: int,
+                 error_rate: float,
+                 sync_interval: float,
+                 max_age: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.filter = BloomFilter(capacity, error_rate)
+        self._synced_score = 0.0
+        self._rebuilt_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def might_be_revoked(self, token_id: str) -> bool:
+        return token_id in self.filter
+
+    async def revoke(self, cache: AbstractCache, token_id: str) -> None:
+        self.filter.add(token_id)
+        await cache.put_to_sorted_set(REVOKED_SET_KEY, token_id)
+
+    async def sync(self, cache: AbstractCache) -> None:
+        """
+        Добавляет в фильтр отзывы, сделанные после последней синхронизации
+        """
+        revoked = await cache.get_from_sorted_set(REVOKED_SET_KEY,
+                                                  min_score=self._synced_score)
+        for token_id, score in revoked:
+            self.filter.add(token_id)
+            self._synced_score = max(self._synced_score, score)
+
+    async def rebuild(self, cache: AbstractCache) -> None:
+        """
+        Удаляет отзывы старше времени жизни access-token и собирает фильтр
+        заново
+        """
+        now = time.time()
+        # Scores are Redis time: compare them with the latest synced
+        # revocation, not with the local clock
+        await cache.delete_from_sorted_set(
+            REVOKED_SET_KEY, max_score=self._synced_score - self.max_age)
+        revoked = await cache.get_from_sorted_set(REVOKED_SET_KEY)
+
+        new_filter = BloomFilter(max(self.capacity, 2 * len(revoked)),
+                                 self.error_rate)
+        synced_score = 0.0
+        for token_id, score in revoked:
+            new_filter.add(token_id)
+            synced_score = max(synced_score, score)
+        self.filter = new_filter
+        self._synced_score = synced_score
+        self._rebuilt_at = now
+        logging.info('Revocation filter rebuilt with %s tokens', len(revoked))
+
+    async def _run(self, cache: AbstractCache) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                if time.time() - self._rebuilt_at >= self.max_age:
+                    await self.rebuild(cache)
+                else:
+                    await self.sync(cache)
+            except Exception:
+                logging.exception('Revocation filter sync failed')
+
+    async def start(self, cache: AbstractCache) -> None:
+        try:
+            await self.rebuild(cache)
+        except Exception:
+            # Background task will retry
+            logging.exception('Revocation filter build failed')
+        self._task = asyncio.create_task(self._run(cache))
+
+    async def stop(self) -> None:
+        """
+        Останавливает синхронизацию и ждет ее завершения
+        """
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,23 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from services.local_cache import LocalCache
+from services.repositories.roles import RoleRepository
+
+ROLES_KEY = 'roles'
+
+# Process wide copy of `roles` table: {title: permissions}. Reset by roles
+# router on every change, TTL keeps other workers up to date.
+_roles_cache = LocalCache(maxsize=1, ttl=settings.roles_cache_ttl)
+
+
+async def get_roles_permissions(db: AsyncSession) -> dict[str, int]:
+    roles = _roles_cache.get(ROLES_KEY)
+    if roles is None:
+        roles = await RoleRepository(db).get_titles_permissions()
+        _roles_cache.put(ROLES_KEY, roles)
+    return roles
+
+
+def invalidate_roles_cache() -> None:
+    _roles_cache.clear()
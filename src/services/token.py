@@ -1,4 +1,6 @@
+import base64
 import logging
+import uuid
 from datetime import datetime, timedelta
 from logging import config as logging_config
 from typing import Annotated
@@ -8,15 +10,20 @@ from core.logger import LOGGING
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError, ExpiredSignatureError
-from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from core.config import settings
+from core.metrics import timed
 from db import AbstractCache
+from services import password
 from services.database import CacheDep
 from services.exceptions import credentials_exception, \
     access_token_invalid_exception, relogin_exception
+from services.local_cache import LocalCache
+from services.permissions import get_permissions_claims
+from services.revocation import RevocationList
 
 logging_config.dictConfig(LOGGING)
 
@@ -26,6 +33,11 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_MINUTES = 7 * 24 * 60  # 7 days
 
+# Cache keys are '<prefix><16 bytes of jti>'. Tokens issued without jti are
+# stored by the whole token string, see _token_key.
+REVOKED_ACCESS_PREFIX = b'invalid-access-token:'
+REFRESH_PREFIX = b'refresh-token:'
+
 
 class Token(BaseModel):
     access_token: str
@@ -39,20 +51,61 @@ class TokenData(BaseModel):
     id: str | None = None
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# Already verified access tokens with decoded claims. Entry expires together
+# with the token.
+verified_tokens = LocalCache(maxsize=settings.token_cache_size)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Local filter of logged out access tokens. Only tokens found in the filter
+# are checked in cache.
+revoked_tokens = RevocationList(
+    capacity=settings.revocation_filter_capacity,
+    error_rate=settings.revocation_filter_error_rate,
+    sync_interval=settings.revocation_sync_interval,
+    max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def verify_password(plain_password, hashed_password):
+    return await password.hasher.verify(plain_password, hashed_password)
 
 
-async def create_token(data: dict, cache: CacheDep) -> dict:
+async def get_password_hash(plain_password):
+    return await password.hasher.hash(plain_password)
+
+
+def _new_jti() -> str:
+    # 16 random bytes, base64url without padding: 22 chars
+    return base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b'=').decode()
+
+
+def _token_key(prefix: bytes, claims: dict, token: str) -> bytes | str:
+    """
+    Ключ токена в кэше: префикс и 16 байт jti.
+    Токены, выпущенные до появления jti, хранятся по всей строке токена:
+    для них остается старый формат ключа, пока они не истекут
+    (REFRESH_TOKEN_EXPIRE_MINUTES).
+    """
+    jti = claims.get("jti")
+    if jti is None:
+        if prefix == REFRESH_PREFIX:
+            return token
+        return f'{prefix.decode()}{token}'
+    return prefix + base64.urlsafe_b64decode(jti + '==')
+
+
+def _token_id(claims: dict, token: str) -> str:
+    return claims.get("jti") or token
+
+
+def encode_tokens(data: dict,
+                  refresh_jti: str = None) -> tuple[dict, bytes | str]:
+    """
+    Создает пару access/refresh token
+    :param data: claims, обязателен sub
+    :param refresh_jti: jti refresh token, по умолчанию новый
+    :return: пара токенов и ключ refresh token в кэше
+    """
     access_token_expires =\
         datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = \
@@ -61,34 +114,59 @@ async def create_token(data: dict, cache: CacheDep) -> dict:
     to_encode = data.copy()
 
     # Configure access-token
-    to_encode.update({"exp": access_token_expires})
+    to_encode.update({"exp": access_token_expires, "jti": _new_jti()})
     access_token = jwt.encode(to_encode,
                               SECRET_KEY,
                               algorithm=ALGORITHM)
 
     # Configure refresh-token
-    to_encode.update({"exp": refresh_token_expires})
+    to_encode.update({"exp": refresh_token_expires,
+                      "jti": refresh_jti or _new_jti()})
     refresh_token = jwt.encode(to_encode,
                                SECRET_KEY_REFRESH,
                                algorithm=ALGORITHM)
 
-    # Put to cache `{refresh_token}:{user_id}` to receive user id from refresh
-    # token. It will be used later to create access token from user id. Will be
-    # kept in cache for REFRESH_TOKEN_EXPIRE_MINUTES in seconds.
-    await cache.put_to_cache_by_id(_id=refresh_token,
-                                   entity=to_encode['sub'],
+    return ({'access_token': access_token,
+             'refresh_token': refresh_token,
+             'access_token_expires': access_token_expires,
+             'refresh_token_expires': refresh_token_expires,
+             "token_type": "bearer"},
+            _token_key(REFRESH_PREFIX, to_encode, refresh_token))
+
+
+async def create_token(data: dict, cache: CacheDep) -> dict:
+    token_structure, refresh_key = encode_tokens(data)
+
+    # Put to cache `refresh-token:{jti}: {user_id}` to receive user id from
+    # refresh token. It will be used later to create access token from user
+    # id. Will be kept in cache for REFRESH_TOKEN_EXPIRE_MINUTES in seconds.
+    await cache.put_to_cache_by_id(_id=refresh_key,
+                                   entity=data['sub'],
                                    expire=int(REFRESH_TOKEN_EXPIRE_MINUTES*60))
 
-    return {'access_token': access_token,
-            'refresh_token': refresh_token,
-            'access_token_expires': access_token_expires,
-            'refresh_token_expires': refresh_token_expires,
-            "token_type": "bearer"}
+    return token_structure
+
+
+def decode_access_token(token: str) -> dict:
+    """
+    Проверяет подпись access token и возвращает claims. Результат проверки
+    кэшируется в памяти процесса до истечения токена.
+    :param token: access token
+    :return: claims
+    """
+    payload = verified_tokens.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        verified_tokens.put(token, payload, expire_at=payload.get("exp"))
+    return payload
 
 
 async def decode_token(token: str, key: str) -> tuple[str, str]:
     try:
-        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+        if key == SECRET_KEY:
+            payload = decode_access_token(token)
+        else:
+            payload = jwt.decode(token, key, algorithms=[ALGORITHM])
         token_expire = payload.get("exp")
         sub = payload.get("sub")
         cache_expire = token_expire - int(datetime.timestamp(datetime.now()))
@@ -99,62 +177,103 @@ async def decode_token(token: str, key: str) -> tuple[str, str]:
         raise credentials_exception
 
 
-async def check_access_token(
+@timed('get_access_claims')
+async def get_access_claims(
         token: Annotated[str, Depends(oauth2_scheme)],
-        cache: CacheDep):
+        cache: CacheDep) -> dict:
     """
-    Проверяет есть ли недействительный access-token в cache
+    Проверяет access-token и возвращает его claims. FastAPI вызывает
+    зависимость один раз за запрос, поэтому все остальные зависимости
+    используют уже проверенные claims.
     :param token:
     :param cache: подключение к DB
-    :return:
+    :return: claims
     """
-    # Check if access token isn't valid (User logged out)
-    not_valid = await \
-        cache.get_from_cache_by_id(_id=f'invalid-access-token:{token}')
-    if not_valid or token == 'undefined':
+    if token == 'undefined':
         raise credentials_exception
 
     try:
         # Check if access token is expired. If yes - ask to create new pair
         # using /refresh method
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logging.info('Access token is valid')
-        return Token(**{"access_token": token,
-                        "token_type": "bearer",
-                        "access_token_expires": payload.get("exp")})
+        payload = decode_access_token(token)
     except ExpiredSignatureError:
         raise access_token_invalid_exception
+    except JWTError:
+        raise credentials_exception
+
+    if payload.get("sub") is None:
+        raise credentials_exception
+
+    # Check if access token isn't valid (User logged out). Filter has no
+    # false negatives, so cache is asked only for possibly revoked tokens.
+    if revoked_tokens.might_be_revoked(_token_id(payload, token)):
+        not_valid = await cache.get_from_cache_by_id(
+            _id=_token_key(REVOKED_ACCESS_PREFIX, payload, token))
+        if not_valid:
+            raise credentials_exception
+    logging.debug('Access token is valid')
+    return payload
+
+
+ClaimsDep = Annotated[dict, Depends(get_access_claims)]
+
+
+@timed('check_access_token')
+async def check_access_token(
+        token: Annotated[str, Depends(oauth2_scheme)],
+        claims: ClaimsDep):
+    """
+    Проверяет есть ли недействительный access-token в cache
+    :param token:
+    :param claims: claims проверенного access-token
+    :return:
+    """
+    return Token(**{"access_token": token,
+                    "token_type": "bearer",
+                    "access_token_expires": claims.get("exp")})
 
 
 async def refresh_access_token(
         refresh_token: str,
-        cache: AbstractCache):
+        cache: AbstractCache,
+        db: AsyncSession):
     """
     Обновляет access token по refresh token
     :param refresh_token: refresh token
     :param cache: подключение к DB
+    :param db: подключение к DB, для получения permissions пользователя
     :return:
     """
     # If refresh token is invalid - exit immediately
     try:
-        jwt.decode(refresh_token, SECRET_KEY_REFRESH, algorithms=[ALGORITHM])
+        claims = jwt.decode(refresh_token,
+                            SECRET_KEY_REFRESH,
+                            algorithms=[ALGORITHM])
     except JWTError:
         raise relogin_exception
 
-    # check id from refresh token exists in cache
-    user_id = await cache.get_from_cache_by_id(_id=refresh_token)
-
-    # If it doesn't exist then refresh token was expired or user never logged
-    # in or refresh token has already been used
-    if not user_id:
+    user_id = claims.get("sub")
+    if user_id is None:
         raise relogin_exception
 
-    # remove refresh-token:user_id from cache, we will create new pair
-    await cache.delete_from_cache_by_id(_id=refresh_token)
-
-    # create a new pair of tokens using id
-    token_structure = await create_token({"sub": str(user_id, 'utf-8')}, cache)
+    # Replace `refresh-token:{jti}` with the new one in a single atomic call.
+    # If old key doesn't exist then refresh token was expired or user never
+    # logged in or refresh token has already been used (also by a concurrent
+    # request). Done before permissions are read, so replayed tokens don't
+    # reach DB.
+    new_refresh_jti = _new_jti()
+    rotated = await cache.pop_and_put_by_id(
+        old_id=_token_key(REFRESH_PREFIX, claims, refresh_token),
+        new_id=_token_key(REFRESH_PREFIX, {"jti": new_refresh_jti}, ''),
+        entity=user_id,
+        expire=int(REFRESH_TOKEN_EXPIRE_MINUTES*60))
+    if not rotated:
+        raise relogin_exception
 
+    # create a new pair of tokens using id and actual permissions
+    permissions = await get_permissions_claims(db, cache, user_id)
+    token_structure, _ = encode_tokens({"sub": user_id, **permissions},
+                                       new_refresh_jti)
     return Token(**token_structure)
 
 
@@ -163,16 +282,19 @@ async def add_not_valid_access_token_to_cache(
         cache: AbstractCache) -> None:
     """
     Добавляет access-token в cache в виде
-    'invalid-access-token:<access-token>' : '<username>'
+    'invalid-access-token:<jti>' : '<username>'
     :param token:
     :param cache: подключение к DB
     :return:
     """
     sub, cache_expire = await decode_token(token.access_token, SECRET_KEY)
+    claims = decode_access_token(token.access_token)
     await cache.put_to_cache_by_id(
-                            _id=f'invalid-access-token:{token.access_token}',
-                            entity=sub,
-                            expire=cache_expire)
+        _id=_token_key(REVOKED_ACCESS_PREFIX, claims, token.access_token),
+        entity=sub,
+        expire=cache_expire)
+    await revoked_tokens.revoke(cache, _token_id(claims, token.access_token))
+    verified_tokens.pop(token.access_token)
 
 
 TokenDep = Annotated[Token, Depends(check_access_token)]
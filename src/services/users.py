@@ -5,36 +5,78 @@ from uuid import UUID
 from fastapi import Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 
-from sqlalchemy.future import select
-
-from services.database import DbDep
-from services.token import verify_password, TokenData, \
-    SECRET_KEY, decode_token, oauth2_scheme
-from services.exceptions import credentials_exception
+import orjson
+
+from core.config import settings
+from core.metrics import timed
+from db import AbstractCache
+from services import history
+from services.database import DbDep, CacheDep
+from services.repositories.users import UserRepository
+from services.permissions import PERMISSIONS_CLAIM, VERSION_CLAIM, \
+    get_permissions_version, get_user_permissions
+from services.roles import get_roles_permissions
+from services.token import verify_password, TokenData, ClaimsDep
+from services.exceptions import credentials_exception, \
+    permissions_changed_exception
 from models.users import User
-from models.roles import UserRole, Role
-from models.history import LoginHistory
-from schemas.users import UserInDB
+from schemas.users import UserInDB, UserResponseData
+
+
+def _user_key(user_id) -> str:
+    return f'user:{user_id}'
 
 
 async def get_user(db: DbDep,
                    _id: str = None,
                    email: str = None):
+    """
+    Возвращает пользователя по id или email
+    """
     async with db:
+        users = UserRepository(db)
         if _id:
-            user_exists = await db.execute(
-                select(User).
-                where(User.id == _id))
+            user = await users.get_by_id(_id)
         elif email:
-            user_exists = await db.execute(
-                select(User).
-                where(User.email == email))
+            user = await users.get_by_email(email)
         else:
             raise logging.exception("Parameters _id or email weren't "
                                     "fulfilled")
-        user = user_exists.scalars().all()
-        if user:
-            return UserInDB(**jsonable_encoder(user[0]))
+        if not user:
+            return None
+        return UserInDB(**jsonable_encoder(user))
+
+
+async def get_user_profile(db: DbDep,
+                           _id: str,
+                           cache: AbstractCache) -> UserResponseData | None:
+    """
+    Возвращает пользователя по id без хэша пароля. Пользователь сначала
+    ищется в кэше как 'user:<user_id>'
+    """
+    use_cache = bool(settings.user_cache_expire)
+    if use_cache:
+        cached = await cache.get_from_cache_by_id(_user_key(_id))
+        if cached:
+            return UserResponseData(**orjson.loads(cached))
+
+    user = await get_user(db, _id=_id)
+    if not user:
+        return None
+    # The password hash is only needed by authenticate_user, which reads
+    # the user from DB, so it's never cached
+    profile = UserResponseData(**user.dict(exclude={'hashed_password'}))
+
+    if use_cache:
+        await cache.put_to_cache_by_id(
+            _id=_user_key(_id),
+            entity=orjson.dumps(profile.dict()),
+            expire=settings.user_cache_expire)
+    return profile
+
+
+async def invalidate_user_cache(cache: AbstractCache, user_id) -> None:
+    await cache.delete_from_cache_by_id(_user_key(user_id))
 
 
 async def authenticate_user(username: str,
@@ -43,16 +85,17 @@ async def authenticate_user(username: str,
     user = await get_user(email=username, db=db)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
-                           db: DbDep):
-    _id, _ = await decode_token(token, SECRET_KEY)
-    token_data = TokenData(id=_id)
-    user = await get_user(_id=token_data.id, db=db)
+@timed('get_current_user')
+async def get_current_user(claims: ClaimsDep,
+                           db: DbDep,
+                           cache: CacheDep):
+    token_data = TokenData(id=claims.get('sub'))
+    user = await get_user_profile(db, token_data.id, cache)
     if user is None:
         raise credentials_exception
     return user
@@ -68,45 +111,42 @@ async def get_current_active_user(
     return current_user
 
 
-async def check_admin_user(token: Annotated[str, Depends(oauth2_scheme)],
-                           db: DbDep):
-    try:
-        user_id, _ = await decode_token(token, SECRET_KEY)
-
-        roles_exists = await db.execute(
-            select(UserRole).
-            filter(UserRole.user_id == user_id)
-        )
-        all_roles = [row.role_id for row in roles_exists.scalars().all()]
-        permissions = 0
-        for r_id in all_roles:
-            response = await db.execute(select(Role).filter(Role.id == r_id))
-            role = response.scalars().first()
-            if role.permissions > permissions:
-                permissions = role.permissions
-        admin = await db.execute(
-            select(Role).
-            filter(Role.title == 'admin')
-        )
-        if admin.scalars().first().permissions <= permissions:
-            return True
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="You don't have permission to access on "
-                                   "this server.",
-                            headers={"WWW-Authenticate": "Bearer"})
-    except IndexError:
+@timed('check_admin_user')
+async def check_admin_user(claims: ClaimsDep,
+                           db: DbDep,
+                           cache: CacheDep):
+    user_id = claims.get('sub')
+
+    admin_permissions = (await get_roles_permissions(db)).get('admin')
+    if admin_permissions is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Role admin not found.",
                             headers={"WWW-Authenticate": "Bearer"})
 
-
-async def add_history(db: DbDep,
-                      user_id: UUID,
-                      source: str = None) -> None:
-    history = LoginHistory(user_id, source)
-    db.add(history)
-    await db.commit()
-    await db.refresh(history)
+    if PERMISSIONS_CLAIM in claims:
+        # Authorize from the token itself, unless user's roles were changed
+        # after the token was issued
+        version = await get_permissions_version(cache, user_id)
+        if claims.get(VERSION_CLAIM) != version:
+            raise permissions_changed_exception
+        permissions = claims[PERMISSIONS_CLAIM]
+    else:
+        # Tokens issued before permissions claims were introduced
+        permissions = await get_user_permissions(db, cache, user_id)
+
+    if admin_permissions <= permissions:
+        return True
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                        detail="You don't have permission to access on "
+                               "this server.",
+                        headers={"WWW-Authenticate": "Bearer"})
+
+
+async def add_history(user_id: UUID,
+                      source: str = None,
+                      user_agent: str = None) -> None:
+    # Written to DB in background by the history writer
+    await history.writer.add(user_id, source, user_agent)
 
 
 CheckAdminDep = Annotated[bool, Depends(check_admin_user)]
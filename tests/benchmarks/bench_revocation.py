@@ -0,0 +1,111 @@
+"""
+Нагрузочный бенчмарк проверки access-token (get_access_claims): сравнивает
+проверку отзыва токена через Redis на каждый запрос и через bloom filter.
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python3 -m tests.benchmarks.bench_revocation
+    PYTHONPATH=src python3 -m tests.benchmarks.bench_revocation --fake \
+        --latency 0.5
+"""
+import asyncio
+import json
+import time
+import uuid
+
+import typer
+
+from db.redis import Redis
+from services import token
+from services.revocation import RevocationList
+from tests.benchmarks.utils import percentiles
+
+
+class AlwaysRevoked(RevocationList):
+    """Каждый токен проверяется в Redis, как без bloom filter"""
+    def might_be_revoked(self, token_id: str) -> bool:
+        return True
+
+
+def make_cache(fake: bool, latency: float) -> Redis:
+    if fake:
+        import fakeredis.aioredis
+
+        cache = Redis()
+        cache.session = fakeredis.aioredis.FakeRedis()
+    else:
+        cache = Redis(host=token.settings.redis_host,
+                      port=token.settings.redis_port)
+
+    if latency:
+        # Emulate network round-trip to Redis
+        get = cache.get_from_cache_by_id
+
+        async def slow_get(_id):
+            await asyncio.sleep(latency / 1000)
+            return await get(_id)
+        cache.get_from_cache_by_id = slow_get
+    return cache
+
+
+async def run(cache: Redis,
+              tokens: list[str],
+              requests: int,
+              concurrency: int) -> dict:
+    samples = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(tokens[i % len(tokens)])
+
+    async def worker():
+        while not queue.empty():
+            access_token = queue.get_nowait()
+            start = time.perf_counter()
+            await token.get_access_claims(access_token, cache)
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {'rps': requests / elapsed, **percentiles(samples)}
+
+
+async def bench(fake: bool,
+                latency: float,
+                requests: int,
+                concurrency: int,
+                revoked: int) -> dict:
+    cache = make_cache(fake, latency)
+    tokens = []
+    for _ in range(100):
+        structure = await token.create_token({"sub": str(uuid.uuid4())},
+                                             cache)
+        tokens.append(structure['access_token'])
+
+    bloom = token.revoked_tokens
+    # Other users' logouts, so the filter isn't empty
+    for _ in range(revoked):
+        await bloom.revoke(cache, str(uuid.uuid4()))
+
+    results = {}
+    for name, revocation in (('redis', AlwaysRevoked(1, 0.5, 1, 1)),
+                             ('bloom', bloom)):
+        token.revoked_tokens = revocation
+        results[name] = await run(cache, tokens, requests, concurrency)
+    token.revoked_tokens = bloom
+    await cache.close()
+    return results
+
+
+def main(fake: bool = typer.Option(False, help='Use fakeredis'),
+         latency: float = typer.Option(0.0,
+                                       help='Extra Redis latency, ms'),
+         requests: int = 20000,
+         concurrency: int = 100,
+         revoked: int = 10000):
+    results = asyncio.run(bench(fake, latency, requests, concurrency,
+                                revoked))
+    typer.echo(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    typer.run(main)
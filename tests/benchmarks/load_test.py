@@ -0,0 +1,273 @@
+"""
+Нагрузочный тест горячих путей auth: login, refresh, /users/me и вызовы
+ролей с проверкой прав администратора. Приложение FastAPI вызывается в
+процессе через httpx без сети, Redis заменен на fakeredis, для Postgres
+создается одноразовая база на сервере из DB_HOST, которая удаляется после
+теста. Результат - пропускная способность и p50/p95/p99 по каждому
+endpoint в JSON, который можно сравнить с результатом другого коммита.
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python3 -m tests.benchmarks.load_test \
+        --output baseline.json
+    PYTHONPATH=src python3 -m tests.benchmarks.load_test \
+        --compare baseline.json
+"""
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+import typer
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import database_dsn
+from db import postgres, redis
+from main import app, shutdown, startup
+from models.roles import Role, UserRole
+from models.users import User
+from services.password import hash_password
+from tests.benchmarks.utils import percentiles
+
+API = '/api/v1'
+PASSWORD = 'Secret123'
+
+
+class FakeRedis(redis.Redis):
+    """Redis с fakeredis вместо соединения"""
+    def __init__(self, **params):
+        super().__init__(**params)
+        import fakeredis.aioredis
+
+        self.session = fakeredis.aioredis.FakeRedis()
+
+
+def server_url(dbname: str) -> str:
+    return f'postgresql+asyncpg://' \
+           f'{database_dsn.user}:{database_dsn.password}@' \
+           f'{database_dsn.host}:{database_dsn.port}/{dbname}'
+
+
+async def execute_autocommit(sql: str) -> None:
+    # CREATE/DROP DATABASE can't run inside a transaction
+    engine = create_async_engine(server_url('postgres'),
+                                 isolation_level='AUTOCOMMIT')
+    async with engine.connect() as conn:
+        await conn.execute(text(sql))
+    await engine.dispose()
+
+
+async def seed(users: int) -> tuple[list[str], str]:
+    """
+    Создает схему, администратора и пользователей
+    :return: email пользователей, email администратора
+    """
+    async with postgres.postgres.engine.begin() as conn:
+        await conn.execute(text('CREATE SCHEMA IF NOT EXISTS auth'))
+    await postgres.postgres.create_database()
+
+    # One hash for everyone: seeding shouldn't take longer than the test
+    password = hash_password(PASSWORD)
+    emails = [f'user{i}@example.com' for i in range(users)]
+    admin_email = 'admin@example.com'
+    async with postgres.postgres.async_session() as session:
+        admin = User(admin_email, password, 'admin', 'admin')
+        role = Role('admin', 7)
+        session.add_all([admin, role] + [User(email, password, 'load', 'test')
+                                         for email in emails])
+        await session.flush()
+        session.add(UserRole(admin.id, role.id))
+        await session.commit()
+    return emails, admin_email
+
+
+async def login(client: httpx.AsyncClient, email: str) -> dict:
+    response = await client.post(f'{API}/auth/login',
+                                 data={'username': email,
+                                       'password': PASSWORD})
+    response.raise_for_status()
+    return response.json()
+
+
+def bearer(tokens: dict) -> dict:
+    return {'Authorization': f'Bearer {tokens["access_token"]}'}
+
+
+async def run(name: str,
+              call: Callable[[int], Awaitable[httpx.Response]],
+              requests: int,
+              concurrency: int) -> dict:
+    """
+    Выполняет call(worker) requests раз в concurrency параллельных
+    воркерах
+    :return: rps, количество ошибок и перцентили длительности запроса
+    """
+    samples = []
+    errors = 0
+    remaining = requests
+
+    async def worker(number: int):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await call(number)
+            samples.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    typer.echo(f'{name}: {requests / elapsed:.0f} rps', err=True)
+    return {'rps': requests / elapsed, 'errors': errors,
+            **percentiles(samples)}
+
+
+async def scenarios(client: httpx.AsyncClient,
+                    emails: list[str],
+                    admin_email: str,
+                    requests: int,
+                    login_requests: int,
+                    concurrency: int) -> dict:
+    sessions = [await login(client, email)
+                for email in emails[:concurrency]]
+    admin = await login(client, admin_email)
+    user_id = (await client.get(f'{API}/users/me',
+                                headers=bearer(sessions[0]))).json()['id']
+
+    async def login_call(worker: int) -> httpx.Response:
+        return await client.post(
+            f'{API}/auth/login',
+            data={'username': emails[worker % len(emails)],
+                  'password': PASSWORD})
+
+    async def refresh_call(worker: int) -> httpx.Response:
+        # Refresh token is single use: every worker keeps its own chain
+        response = await client.post(
+            f'{API}/auth/refresh',
+            params={'token': sessions[worker]['refresh_token']})
+        if response.status_code == 200:
+            sessions[worker] = response.json()
+        return response
+
+    async def me_call(worker: int) -> httpx.Response:
+        return await client.get(f'{API}/users/me',
+                                headers=bearer(sessions[worker]))
+
+    async def roles_call(worker: int) -> httpx.Response:
+        return await client.get(f'{API}/roles/', headers=bearer(admin))
+
+    async def user_roles_call(worker: int) -> httpx.Response:
+        return await client.get(f'{API}/users/roles',
+                                params={'user_id': user_id},
+                                headers=bearer(admin))
+
+    # Login is bcrypt bound, so it gets fewer requests
+    return {'login': await run('login', login_call, login_requests,
+                               concurrency),
+            'refresh': await run('refresh', refresh_call, requests,
+                                 concurrency),
+            'users_me': await run('users_me', me_call, requests,
+                                  concurrency),
+            'roles': await run('roles', roles_call, requests, concurrency),
+            'user_roles': await run('user_roles', user_roles_call, requests,
+                                    concurrency)}
+
+
+async def bench(users: int,
+                requests: int,
+                login_requests: int,
+                concurrency: int,
+                fake: bool) -> dict:
+    dbname = f'auth_bench_{uuid.uuid4().hex[:8]}'
+    await execute_autocommit(f'CREATE DATABASE {dbname}')
+    database_dsn.dbname = dbname
+    if fake:
+        redis.Redis = FakeRedis
+    try:
+        await startup()
+        try:
+            emails, admin_email = await seed(max(users, concurrency))
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport,
+                                         base_url='http://bench') as client:
+                return await scenarios(client, emails, admin_email,
+                                       requests, login_requests,
+                                       concurrency)
+        finally:
+            await shutdown()
+    finally:
+        await execute_autocommit(f'DROP DATABASE IF EXISTS {dbname}')
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    Печатает изменение rps и перцентилей по каждому endpoint
+    :return: False, если p99 какого-либо endpoint вырос больше threshold
+    процентов
+    """
+    ok = True
+    typer.echo(f'{"endpoint":<12}{"metric":<10}{"baseline":>12}'
+               f'{"current":>12}{"change":>10}')
+    for endpoint, metrics in current['endpoints'].items():
+        old = baseline['endpoints'].get(endpoint)
+        if not old:
+            continue
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = (metrics[metric] - old[metric]) / old[metric] * 100
+            typer.echo(f'{endpoint:<12}{metric:<10}{old[metric]:>12.2f}'
+                       f'{metrics[metric]:>12.2f}{change:>+9.1f}%')
+            if metric == 'p99_ms' and change > threshold:
+                ok = False
+    return ok
+
+
+def main(
+        users: int = typer.Option(100, help='Users to create'),
+        requests: int = typer.Option(5000, help='Requests per endpoint'),
+        login_requests: int = typer.Option(500, help='Login requests'),
+        concurrency: int = 50,
+        fake: bool = typer.Option(True, help='Use fakeredis instead of '
+                                             'REDIS_HOST'),
+        output: Path = typer.Option(None, help='Write results to file'),
+        compare_with: Path = typer.Option(
+            None, '--compare', exists=True, dir_okay=False,
+            help='Baseline to compare with'),
+        threshold: float = typer.Option(
+            20, help='Allowed p99 regression against baseline, %')):
+    results = {'commit': git_commit(),
+               'python': platform.python_version(),
+               'requests': requests,
+               'login_requests': login_requests,
+               'concurrency': concurrency,
+               'fake_redis': fake,
+               'endpoints': asyncio.run(bench(users, requests, login_requests,
+                                              concurrency, fake))}
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+    else:
+        typer.echo(json.dumps(results, indent=2))
+
+    if compare_with:
+        baseline = json.loads(compare_with.read_text())
+        if not compare(baseline, results, threshold):
+            raise typer.Exit(1)
+
+
+if __name__ == '__main__':
+    typer.run(main)
@@ -0,0 +1,78 @@
+"""
+Сравнение памяти Redis для хранения refresh-token и отозванных access-token:
+ключи по всей строке токена (старый формат) и по 16 байтам jti.
+Использует отдельную базу Redis (--db), которая очищается перед каждым
+замером.
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python3 -m tests.benchmarks.redis_memory --sessions 100000
+"""
+import asyncio
+import json
+import uuid
+
+import typer
+from redis.asyncio import Redis as AsyncRedis
+
+from services import token
+
+BATCH = 1000
+
+
+def legacy_keys(tokens: dict) -> tuple[str, str]:
+    return (tokens['refresh_token'],
+            f'invalid-access-token:{tokens["access_token"]}')
+
+
+def jti_keys(tokens: dict) -> tuple[bytes, bytes]:
+    access = token.decode_access_token(tokens['access_token'])
+    refresh = token.jwt.decode(tokens['refresh_token'],
+                               token.SECRET_KEY_REFRESH,
+                               algorithms=[token.ALGORITHM])
+    return (token._token_key(token.REFRESH_PREFIX, refresh, ''),
+            token._token_key(token.REVOKED_ACCESS_PREFIX, access, ''))
+
+
+async def measure(client: AsyncRedis, sessions: int, make_keys) -> dict:
+    await client.flushdb()
+    before = (await client.info('memory'))['used_memory']
+    key_bytes = 0
+    for start in range(0, sessions, BATCH):
+        pipe = client.pipeline(transaction=False)
+        for _ in range(min(BATCH, sessions - start)):
+            user_id = str(uuid.uuid4())
+            tokens = await token.create_token({"sub": user_id},
+                                              NullCache())
+            for key in make_keys(tokens):
+                key_bytes += len(key)
+                pipe.set(key, user_id, ex=3600)
+        await pipe.execute()
+    after = (await client.info('memory'))['used_memory']
+    await client.flushdb()
+    return {'used_memory_bytes': after - before,
+            'bytes_per_session': (after - before) / sessions,
+            'key_bytes_per_session': key_bytes / sessions}
+
+
+class NullCache:
+    async def put_to_cache_by_id(self, *args, **kwargs):
+        ...
+
+
+async def compare(sessions: int, db: int) -> dict:
+    client = AsyncRedis(host=token.settings.redis_host,
+                        port=token.settings.redis_port,
+                        db=db)
+    results = {'token': await measure(client, sessions, legacy_keys),
+               'jti': await measure(client, sessions, jti_keys)}
+    await client.close()
+    return results
+
+
+def main(sessions: int = 100000,
+         db: int = typer.Option(15, help='Redis database, will be flushed')):
+    typer.echo(json.dumps(asyncio.run(compare(sessions, db)), indent=2))
+
+
+if __name__ == '__main__':
+    typer.run(main)
@@ -0,0 +1,114 @@
+"""
+Микробенчмарки токенов, bcrypt и разбора кэша (pytest-benchmark). Нужны,
+чтобы оценить эффект оптимизаций services/token.py и db/redis.py и
+заметить регрессии при обновлении python-jose или passlib.
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python3 -m pytest tests/benchmarks/test_micro.py \
+        --benchmark-autosave
+    PYTHONPATH=src python3 -m pytest tests/benchmarks/test_micro.py \
+        --benchmark-compare
+"""
+import json
+import uuid
+
+import pytest
+from passlib.hash import bcrypt
+
+from db.redis import Redis
+from schemas.roles import RoleCreate
+from services import password, token
+
+PASSWORD = 'Secret123'
+
+
+def run(coro):
+    """
+    Выполняет корутину, которая не ждет IO, без event loop: в замер не
+    попадают накладные расходы loop
+    """
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError('Coroutine is waiting for IO')
+
+
+class NullCache:
+    async def put_to_cache_by_id(self, *args, **kwargs):
+        ...
+
+    async def get_from_cache_by_id(self, *args, **kwargs):
+        return None
+
+
+class HashSession:
+    """Redis session, которая сразу возвращает hash из памяти"""
+    def __init__(self, data: dict):
+        self.data = data
+
+    async def hgetall(self, key):
+        return self.data
+
+
+@pytest.fixture
+def claims() -> dict:
+    return {'sub': str(uuid.uuid4()), 'permissions': 7, 'roles': ['admin']}
+
+
+@pytest.fixture
+def tokens(claims) -> dict:
+    return run(token.create_token(claims, NullCache()))
+
+
+def test_create_token(benchmark, claims):
+    benchmark(lambda: run(token.create_token(claims, NullCache())))
+
+
+def test_decode_token_cached(benchmark, tokens):
+    benchmark(lambda: run(token.decode_token(tokens['access_token'],
+                                             token.SECRET_KEY)))
+
+
+def test_decode_token_uncached(benchmark, tokens):
+    def decode():
+        token.verified_tokens.clear()
+        return run(token.decode_token(tokens['access_token'],
+                                      token.SECRET_KEY))
+    benchmark(decode)
+
+
+def test_decode_refresh_token(benchmark, tokens):
+    benchmark(lambda: run(token.decode_token(tokens['refresh_token'],
+                                             token.SECRET_KEY_REFRESH)))
+
+
+def test_check_access_token(benchmark, tokens):
+    # Whole dependency chain of a protected route: claims, then Token
+    access_token = tokens['access_token']
+    cache = NullCache()
+
+    async def check():
+        claims = await token.get_access_claims(access_token, cache)
+        return await token.check_access_token(access_token, claims)
+    benchmark(lambda: run(check()))
+
+
+@pytest.mark.parametrize('rounds', [4, 10, 12])
+def test_verify_password(benchmark, rounds):
+    hashed = bcrypt.using(rounds=rounds).hash(PASSWORD)
+    assert benchmark(password.verify_password, PASSWORD, hashed)
+
+
+@pytest.mark.parametrize('sort', [None, 'title', '-permissions'])
+@pytest.mark.parametrize('size', [10, 100, 1000])
+def test_get_from_cache_by_key(benchmark, size, sort):
+    cache = Redis()
+    cache.session = HashSession(
+        {str(i).encode(): json.dumps({'title': f'role{i}',
+                                      'permissions': i % 8}).encode()
+         for i in range(size)})
+    result = benchmark(lambda: run(cache.get_from_cache_by_key(
+        RoleCreate, 'roles', sort)))
+    assert len(result) == size
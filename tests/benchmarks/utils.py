@@ -0,0 +1,19 @@
+import statistics
+
+
+def percentiles(samples: list[float]) -> dict:
+    """
+    p50/p95/p99 и среднее для списка длительностей в секундах, в мс
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'count': len(ordered),
+            'mean_ms': statistics.fmean(ordered) * 1000,
+            'p50_ms': pick(0.50),
+            'p95_ms': pick(0.95),
+            'p99_ms': pick(0.99)}
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest_asyncio
 from sqlalchemy.future import select
 
@@ -17,6 +19,26 @@ async def select_row(pg_client):
     yield inner
 
 
+@pytest_asyncio.fixture(scope='function')
+async def wait_for_rows(select_row):
+    async def inner(_id: str, model, column, count: int = 1,
+                    timeout: float = 5):
+        """
+        Ждет, пока записей с column == _id станет не меньше count, например
+        истории логинов, которая пишется в фоне
+        :return: записи, даже если за timeout секунд их не стало count
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            rows = await select_row(_id, model, column)
+            if len(rows) >= count or loop.time() >= deadline:
+                return rows
+            await asyncio.sleep(0.05)
+
+    yield inner
+
+
 @pytest_asyncio.fixture(scope='function')
 async def get_token(session_client):
     async def inner(payload: dict, token_type: str = 'access'):
@@ -1,5 +1,4 @@
 import logging
-from asyncio import sleep
 
 import aiohttp
 import pytest
@@ -138,22 +137,30 @@ class TestLogin:
     async def test_login_user(self,
                               session_client,
                               select_row,
+                              wait_for_rows,
                               payload,
                               expected_answer):
         url = settings.service_url + PREFIX + self.postfix
+        user = await select_row(payload['username'], User, User.email)
+        before = len(await select_row(user[0].id,
+                                      LoginHistory,
+                                      LoginHistory.user_id))
 
         async with session_client.post(url, data=payload) as response:
             body = await response.json()
-            user = await select_row(payload['username'], User, User.email)
-            logins_history = await select_row(user[0].id,
-                                              LoginHistory,
-                                              LoginHistory.user_id)
+            # Login history is written in background
+            logins_history = await wait_for_rows(user[0].id,
+                                                 LoginHistory,
+                                                 LoginHistory.user_id,
+                                                 before + 1)
             assert response.status == expected_answer['status']
             assert 'access_token' in body.keys()
             assert 'access_token_expires' in body.keys()
             assert body['token_type'] == "bearer"
 
             assert logins_history[0].login_time
+            assert logins_history[0].source
+            assert logins_history[0].user_agent_id
 
     @pytest.mark.parametrize(
         'payload, expected_answer',
@@ -270,9 +277,6 @@ class TestRefresh:
         refresh_token = await get_token(payload, 'refresh')
         url = settings.service_url + PREFIX + self.postfix \
                                             + f'?token={refresh_token}'
-        # Without sleep tokens will be created at exactly the same time and
-        # will be equal.
-        await sleep(1)
         async with session_client.post(url) as response:
             body = await response.json()
 
@@ -9,6 +9,7 @@ from logging import config as logging_config
 from tests.functional.settings import settings
 from tests.functional.utils.logger import LOGGING
 
+from src.models.history import LoginHistory
 from src.models.roles import UserRole
 
 # Применяем настройки логирования
@@ -183,6 +184,108 @@ class TestDeleteRole:
                 assert not role
 
 
+@pytest.mark.usefixtures('redis_clear_data_before_after',
+                         'pg_write_data')
+class TestAddRolesBulk:
+    postfix = '/add-roles:bulk'
+
+    @pytest.mark.parametrize(
+        'payload, expected_answer',
+        [
+            (
+                    {"items": [
+                        {
+                            "user_id": "e9756a00-73d6-455c-8bfa-734d859867b0",
+                            "role_id": "0a1af085-c8c4-49c0-8407-6f032589e614"
+                        },
+                        {
+                            "user_id": "e9756a00-73d6-455c-8bfa-734d859867b0",
+                            "role_id": "c1c3c6fc-95df-49cd-81f1-873f0128c404"
+                        },
+                        {
+                            "user_id": "00000000-0000-0000-0000-000000000000",
+                            "role_id": "0a1af085-c8c4-49c0-8407-6f032589e614"
+                        },
+                    ]},
+                    {'status': HTTPStatus.OK,
+                     "statuses": ['created', 'exists', 'user_not_found']},
+            ),
+        ]
+    )
+    async def test_add_roles(self,
+                             get_token,
+                             select_row,
+                             payload,
+                             expected_answer):
+        url = settings.service_url + PREFIX + self.postfix
+        access_data = {"username": "admin@example.com",
+                       "password": "Secret123"}
+        access_token = await get_token(access_data)
+        header = {'Authorization': f'Bearer {access_token}'}
+
+        async with aiohttp.ClientSession(headers=header) as session:
+            async with session.post(url, json=payload) as response:
+                assert response.status == expected_answer['status']
+
+                body = await response.json()
+                roles = await select_row(payload['items'][0]['user_id'],
+                                         UserRole,
+                                         UserRole.user_id)
+
+                assert [item['status'] for item in body] == \
+                       expected_answer['statuses']
+                assert len(roles) == 2
+
+
+@pytest.mark.usefixtures('redis_clear_data_before_after',
+                         'pg_write_data')
+class TestDeleteRolesBulk:
+    postfix = '/delete-roles:bulk'
+
+    @pytest.mark.parametrize(
+        'payload, expected_answer',
+        [
+            (
+                    {"items": [
+                        {
+                            "user_id": "e9756a00-73d6-455c-8bfa-734d859867b0",
+                            "role_id": "c1c3c6fc-95df-49cd-81f1-873f0128c404"
+                        },
+                        {
+                            "user_id": "e9756a00-73d6-455c-8bfa-734d859867b0",
+                            "role_id": "0a1af085-c8c4-49c0-8407-6f032589e614"
+                        },
+                    ]},
+                    {'status': HTTPStatus.OK,
+                     "statuses": ['deleted', 'not_found']},
+            ),
+        ]
+    )
+    async def test_delete_roles(self,
+                                get_token,
+                                select_row,
+                                payload,
+                                expected_answer):
+        url = settings.service_url + PREFIX + self.postfix
+        access_data = {"username": "admin@example.com",
+                       "password": "Secret123"}
+        access_token = await get_token(access_data)
+        header = {'Authorization': f'Bearer {access_token}'}
+
+        async with aiohttp.ClientSession(headers=header) as session:
+            async with session.post(url, json=payload) as response:
+                assert response.status == expected_answer['status']
+
+                body = await response.json()
+                roles = await select_row(payload['items'][0]['user_id'],
+                                         UserRole,
+                                         UserRole.user_id)
+
+                assert [item['status'] for item in body] == \
+                       expected_answer['statuses']
+                assert not roles
+
+
 @pytest.mark.usefixtures('redis_clear_data_before_after',
                          'pg_write_data')
 class TestGetRoles:
@@ -239,11 +342,19 @@ class TestLoginHistory:
     )
     async def test_get_user(self,
                             get_token,
+                            select_row,
+                            wait_for_rows,
                             access_data,
                             expected_answer):
         url = settings.service_url + PREFIX + self.postfix
+        user_id = expected_answer['user_id']
+        before = len(await select_row(user_id, LoginHistory,
+                                      LoginHistory.user_id))
 
         access_token = await get_token(access_data)
+        # Login history is written in background
+        await wait_for_rows(user_id, LoginHistory, LoginHistory.user_id,
+                            before + 1)
         header = {'Authorization': f'Bearer {access_token}'}
 
         async with aiohttp.ClientSession(headers=header) as session:
@@ -255,3 +366,50 @@ class TestLoginHistory:
                 assert datetime.strptime(
                     body[0]['login_time'][:body[0]['login_time'].rfind('.')],
                     expected_answer['login_time_format'])
+
+    @pytest.mark.parametrize(
+        'access_data, expected_answer',
+        [
+            (
+              {"username": "admin@example.com",
+               "password": "Secret123"},
+              {'status': HTTPStatus.OK,
+               "user_id": "e9756a00-73d6-455c-8bfa-734d859867b0",
+               "length": 1
+               }
+            )
+        ]
+    )
+    async def test_get_history_by_cursor(self,
+                                         get_token,
+                                         select_row,
+                                         wait_for_rows,
+                                         access_data,
+                                         expected_answer):
+        url = settings.service_url + PREFIX + self.postfix
+        user_id = expected_answer['user_id']
+        before = len(await select_row(user_id, LoginHistory,
+                                      LoginHistory.user_id))
+
+        await get_token(access_data)
+        access_token = await get_token(access_data)
+        # Login history is written in background
+        await wait_for_rows(user_id, LoginHistory, LoginHistory.user_id,
+                            before + 2)
+        header = {'Authorization': f'Bearer {access_token}'}
+
+        async with aiohttp.ClientSession(headers=header) as session:
+            async with session.get(url, params={'page_size': 1}) as response:
+                assert response.status == expected_answer['status']
+                first_page = await response.json()
+                cursor = response.headers['X-Next-Cursor']
+
+            async with session.get(url, params={'page_size': 1,
+                                                'cursor': cursor}) as response:
+                assert response.status == expected_answer['status']
+                second_page = await response.json()
+
+        assert len(second_page) == expected_answer['length']
+        assert second_page[0]['user_id'] == expected_answer['user_id']
+        assert second_page[0]['login_time'] <= first_page[0]['login_time']
+        assert second_page != first_page
@@ -0,0 +1,20 @@
+import pytest
+from starlette.requests import Request
+
+from api.v1 import auth
+
+
+def make_request(real_ip: str) -> Request:
+    return Request({'type': 'http',
+                    'headers': [(b'x-real-ip', real_ip.encode())],
+                    'client': ('10.0.0.1', 50000)})
+
+
+@pytest.mark.parametrize('trusted_proxy, real_ip, expected', [
+    (True, '203.0.113.7', '203.0.113.7'),
+    (True, 'x' * 300, '10.0.0.1'),
+    (False, '203.0.113.7', '10.0.0.1'),
+])
+def test_client_ip(monkeypatch, trusted_proxy, real_ip, expected):
+    monkeypatch.setattr(auth.settings, 'trusted_proxy', trusted_proxy)
+    assert auth._client_ip(make_request(real_ip)) == expected
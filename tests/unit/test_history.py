@@ -0,0 +1,48 @@
+import uuid
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from services.history import HistoryWriter
+
+
+class ForeignKeyViolation(Exception):
+    sqlstate = '23503'
+
+
+class FakeSession:
+    """Сессия, которая не вставляет пачку с удаленным пользователем"""
+    def __init__(self, inserted: list, deleted: set):
+        self.inserted = inserted
+        self.deleted = deleted
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        ...
+
+    async def execute(self, statement, rows):
+        if any(row['user_id'] in self.deleted for row in rows):
+            raise DBAPIError(str(statement), rows, ForeignKeyViolation())
+        self.pending.extend(rows)
+
+    async def commit(self):
+        self.inserted.extend(self.pending)
+
+
+@pytest.mark.asyncio
+async def test_failed_row_does_not_drop_batch():
+    inserted = []
+    deleted = {uuid.uuid4()}
+    writer = HistoryWriter()
+    writer._session_maker = lambda: FakeSession(inserted, deleted)
+    user_ids = [uuid.uuid4() for _ in range(9)] + list(deleted)
+
+    await writer._write([{'user_id': user_id, 'user_agent': None}
+                         for user_id in user_ids])
+
+    assert [row['user_id'] for row in inserted] == user_ids[:-1]
+    assert writer.written == 9
+    assert writer.failed == 1
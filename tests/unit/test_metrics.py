@@ -0,0 +1,44 @@
+from http import HTTPStatus
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from prometheus_client import REGISTRY
+
+from core.metrics import MetricsMiddleware
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/items/{item_id}')
+    async def get_item(item_id: str):
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED)
+
+    return app
+
+
+def request_count(**labels) -> float:
+    return REGISTRY.get_sample_value('http_request_duration_seconds_count',
+                                     labels) or 0
+
+
+@pytest.mark.asyncio
+async def test_error_status_label_is_a_number():
+    transport = httpx.ASGITransport(app=make_app())
+    labels = {'method': 'GET', 'route': '/items/{item_id}'}
+    before = request_count(status='401', **labels)
+
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url='http://test') as client:
+        response = await client.get('/items/1')
+
+    assert response.status_code == 401
+    assert request_count(status='401', **labels) == before + 1
+    statuses = {sample.labels['status']
+                for metric in REGISTRY.collect()
+                if metric.name == 'http_request_duration_seconds'
+                for sample in metric.samples
+                if 'status' in sample.labels}
+    assert all(status.isdigit() for status in statuses)
@@ -0,0 +1,39 @@
+import fakeredis.aioredis
+import pytest
+
+from db.redis import Redis
+from services.permissions import get_permissions_version, \
+    invalidate_user_permissions
+
+
+@pytest.mark.asyncio
+async def test_invalidate_bumps_versions_in_one_call():
+    cache = Redis()
+    cache.session = fakeredis.aioredis.FakeRedis()
+    user_ids = [f'user-{i}' for i in range(100)]
+
+    commands = []
+    execute_command = cache.session.execute_command
+
+    async def count_command(*args, **options):
+        commands.append(args[0])
+        return await execute_command(*args, **options)
+    cache.session.execute_command = count_command
+
+    await invalidate_user_permissions(cache, user_ids)
+
+    assert commands == ['DEL', 'MSET']
+    versions = {await get_permissions_version(cache, user_id)
+                for user_id in user_ids}
+    assert len(versions) == 1 and versions != {0}
+
+
+@pytest.mark.asyncio
+async def test_put_to_cache_by_ids_with_expire():
+    cache = Redis()
+    cache.session = fakeredis.aioredis.FakeRedis()
+
+    await cache.put_to_cache_by_ids({'a': 1, 'b': 2}, expire=60)
+
+    assert await cache.get_from_cache_by_id('b') == b'2'
+    assert 0 < await cache.session.ttl('a') <= 60
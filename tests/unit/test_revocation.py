@@ -0,0 +1,73 @@
+import time
+
+import fakeredis.aioredis
+import pytest
+
+from db.redis import Redis
+from services.revocation import RevocationList
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_cache(server) -> Redis:
+    cache = Redis()
+    cache.session = fakeredis.aioredis.FakeRedis(server=server)
+    return cache
+
+
+def make_worker() -> RevocationList:
+    return RevocationList(capacity=1000, error_rate=0.001, sync_interval=1,
+                          max_age=900)
+
+
+@pytest.mark.asyncio
+async def test_sync_gets_revocations_from_other_workers(server):
+    cache = make_cache(server)
+    worker, other = make_worker(), make_worker()
+    await worker.rebuild(cache)
+
+    await other.revoke(cache, 'token-1')
+    assert not worker.might_be_revoked('token-1')
+    await worker.sync(cache)
+    assert worker.might_be_revoked('token-1')
+
+
+@pytest.mark.asyncio
+async def test_sync_gets_revocation_from_worker_with_clock_behind(
+        server, monkeypatch):
+    cache = make_cache(server)
+    worker, other, late = make_worker(), make_worker(), make_worker()
+    await worker.rebuild(cache)
+    await other.revoke(cache, 'token-1')
+    await worker.sync(cache)
+
+    # Revocation lands after the sync from a host whose clock is an hour
+    # behind
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now - 3600)
+    await late.revoke(cache, 'token-2')
+    monkeypatch.undo()
+
+    await worker.sync(cache)
+    assert worker.might_be_revoked('token-2')
+
+
+@pytest.mark.asyncio
+async def test_scores_grow_with_every_revocation(server):
+    cache = make_cache(server)
+    scores = [await cache.put_to_sorted_set('set', f'token-{i}')
+              for i in range(100)]
+    assert scores == sorted(set(scores))
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_sync_task(server):
+    worker = make_worker()
+    await worker.start(make_cache(server))
+    task = worker._task
+
+    await worker.stop()
+    assert task.done()
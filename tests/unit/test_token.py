@@ -0,0 +1,51 @@
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+
+from db.redis import Redis
+from services import token
+
+
+@pytest.fixture
+def cache() -> Redis:
+    cache = Redis()
+    cache.session = fakeredis.aioredis.FakeRedis()
+    return cache
+
+
+@pytest.fixture
+def permission_lookups(monkeypatch) -> list:
+    lookups = []
+
+    async def get_permissions_claims(db, cache, user_id):
+        lookups.append(user_id)
+        return {}
+    monkeypatch.setattr(token, 'get_permissions_claims',
+                        get_permissions_claims)
+    return lookups
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_refresh_token(cache, permission_lookups):
+    tokens = await token.create_token({'sub': 'user-1'}, cache)
+
+    new_tokens = await token.refresh_access_token(tokens['refresh_token'],
+                                                  cache, db=None)
+    assert permission_lookups == ['user-1']
+
+    # The new refresh token is the one stored by the rotation
+    await token.refresh_access_token(new_tokens.refresh_token, cache,
+                                     db=None)
+    assert permission_lookups == ['user-1', 'user-1']
+
+
+@pytest.mark.asyncio
+async def test_replayed_refresh_token_skips_permissions(cache,
+                                                        permission_lookups):
+    tokens = await token.create_token({'sub': 'user-1'}, cache)
+    await token.refresh_access_token(tokens['refresh_token'], cache, db=None)
+
+    with pytest.raises(HTTPException):
+        await token.refresh_access_token(tokens['refresh_token'], cache,
+                                         db=None)
+    assert permission_lookups == ['user-1']
@@ -0,0 +1,28 @@
+import uuid
+
+import fakeredis.aioredis
+import orjson
+import pytest
+
+from db.redis import Redis
+from schemas.users import UserInDB
+from services import users
+
+
+@pytest.mark.asyncio
+async def test_cached_profile_has_no_password_hash(monkeypatch):
+    cache = Redis()
+    cache.session = fakeredis.aioredis.FakeRedis()
+    user_id = str(uuid.uuid4())
+
+    async def get_user(db, _id=None, email=None):
+        return UserInDB(id=_id, email='user@example.com', first_name='first',
+                        last_name='last', password='$2b$12$hash')
+    monkeypatch.setattr(users, 'get_user', get_user)
+    monkeypatch.setattr(users.settings, 'user_cache_expire', 60)
+
+    profile = await users.get_user_profile(None, user_id, cache)
+
+    cached = orjson.loads(await cache.get_from_cache_by_id(f'user:{user_id}'))
+    assert 'password' not in cached and 'hashed_password' not in cached
+    assert await users.get_user_profile(None, user_id, cache) == profile